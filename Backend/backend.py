@@ -10,8 +10,17 @@ import os
 current_dir = os.path.dirname(os.path.abspath(__file__))
 backend_dir = os.path.dirname(current_dir)
 sys.path.insert(0, backend_dir)
-from utils.data_getters import get_openmeteo_weather, get_aqi, get_pollutants, calculate_current_pollutants 
-from utils.surprise_me import surprise_me 
+from utils.data_getters import get_openmeteo_weather, get_aqi, get_pollutants, calculate_current_pollutants, get_openmeteo_weather_batch, get_aqi_batch, get_pollutants_prevyrs, update_climatology, get_baseline 
+from utils.surprise_me import surprise_me, weather_warmer, north_american_cities 
+from utils.fanout import fan_out, server_timing_header 
+from utils.data_getters import weather_cache, aqi_cache, tile_store 
+from utils.tile_store import TileRefresher 
+from utils.score_scheduler import ScoreScheduler 
+from utils.rsig_cache import integrity_stats 
+from utils.swr import SWRCache 
+from utils.cache import grid_key 
+from utils.jobs import JobManager, JobQueueFull 
+import json 
 
 app = Flask(__name__)
 
@@ -19,6 +28,18 @@ CORS(app)
 
 BBOX = 0.01  # Moved to global scope
 PREVYRS = 5 
+MAX_BATCH_POINTS = 500  # max coordinates accepted by /get_data_batch
+USE_TILE_STORE = False  # read TEMPO from pre-gridded tiles (refreshed hourly in the background)
+# Stale-while-revalidate windows per source, in seconds: (fresh, stale)
+SWR_WINDOWS = {
+    "data": (15 * 60, 60 * 60),  # AQI + weather; Open-Meteo updates every 15 min
+    "pollutants": (60 * 60, 6 * 60 * 60),  # TEMPO/AirNow scores; hourly data, slow to fetch
+}
+MAX_JOB_WAIT = 60  # longest long-poll on /jobs/<id>, seconds
+MAX_PREVYRS = 10  # most previous years a pollutants_prevyrs job may request
+MAX_JOB_DAYS = 31  # longest bdate..edate span of a pollutants_prevyrs job
+
+tile_refresher = TileRefresher(tile_store)
 
 def set_bbox(latitude, longitude): 
     """Calculate bounding box from coordinates"""
@@ -41,17 +62,68 @@ def set_bbox(latitude, longitude):
     return bbox 
 
 def get_aqi_data(bbox): 
-    """Get AQI data for a bounding box"""
-    date = datetime.now().date().strftime("%Y-%m-%d")
-    aqi_data = get_aqi(bbox, date)
+    """Get today's AQI (in the location's timezone) for a bounding box"""
+    aqi_data = get_aqi(bbox)
     return aqi_data  # Return raw data, not jsonified
 
+def get_pollutant_score(bbox, progress=None): 
+    """Download pollutant data for a bounding box and score it"""
+    pollutants_data = get_pollutants(bbox, parallel=True, use_store=True, use_tiles=USE_TILE_STORE, progress=progress)
+    return calculate_current_pollutants(pollutants_data)
+
+def get_prevyrs_data(bbox, bdate, edate=None, prevyrs=PREVYRS, progress=None): 
+    """Multi-year pollutant data for a bounding box as JSON-ready records"""
+    combined = get_pollutants_prevyrs(bbox, bdate, edate, prevyrs=prevyrs, progress=progress)
+    return {key: json.loads(df.to_json(orient="records", date_format="iso")) for key, df in combined.items()}
+
+def update_baseline(bbox): 
+    """Add any new days to the cell's PREVYRS-year climatology and return today's baseline"""
+    update_climatology(bbox, prevyrs=PREVYRS)
+    return get_baseline(bbox)
+
+def city_bboxes(): 
+    """Bounding boxes of the north_american_cities inside the supported region"""
+    bboxes = []
+    for city in north_american_cities.values(): 
+        try: 
+            bboxes.append(set_bbox(city['lat'], city['lon']))
+        except ValueError: 
+            continue # e.g. Panama City is south of ValidCoords.MIN_LAT
+    return bboxes
+
+data_swr = SWRCache(*SWR_WINDOWS["data"], name="data")
+jobs = JobManager(max_workers=2, max_queue=16, result_ttl=60 * 60)
+pollutant_swr = SWRCache(*SWR_WINDOWS["pollutants"], name="pollutants")
+
+# Keeps pollutant scores for the cities and recently requested cells precomputed
+score_scheduler = ScoreScheduler(get_pollutant_score, seeds=city_bboxes(), results=pollutant_swr)
+# Extends the day-of-year climatology of the same cells once a day
+baseline_scheduler = ScoreScheduler(update_baseline, seeds=city_bboxes(), interval=24 * 60 * 60, max_workers=1)
+
 def get_weather_data(bbox): 
     """Get weather data for a bounding box"""
     # Renamed, removed jsonify
     current_weather = get_openmeteo_weather(bbox)
     return current_weather  #Return raw data, not jsonified
 
+def fetch_data(bbox): 
+    """AQI and weather for a bounding box, plus how long each upstream took"""
+    # AQI and weather are independent, so fetch them concurrently
+    print("Fetching AQI and weather data...")
+    results, timings = fan_out({
+        "aqi": (get_aqi_data, (bbox,)),
+        "weather": (get_weather_data, (bbox,)),
+    })
+    print(f"AQI: {results['aqi']}")
+    print("Weather data fetched!")
+    print("Upstream timings: " + ", ".join(f"{name}={elapsed:.3f}s" for name, elapsed in timings.items()))
+    
+    response = {
+        "aqi": results["aqi"],
+        "current_weather": results["weather"]
+    }
+    return {"response": response, "timings": timings}
+
 @app.route("/surprise", methods=["POST", "OPTIONS"])
 def surpriseMe(): 
     if request.method == 'OPTIONS':
@@ -60,6 +132,22 @@ def surpriseMe():
     response = surprise_me()      
     return jsonify(response), 200
 
+@app.route("/surprise/status", methods=["GET"])
+def surpriseStatus(): 
+    """When each city's cached weather was last refreshed"""
+    return jsonify(weather_warmer.status()), 200
+
+@app.route("/cache_stats", methods=["GET"])
+def cacheStats(): 
+    """Hit/miss counters for the in-memory caches and pyrsig cache evictions"""
+    return jsonify({
+        "weather": weather_cache.stats(), 
+        "aqi": aqi_cache.stats(), 
+        "data_swr": data_swr.stats(), 
+        "pollutant_swr": pollutant_swr.stats(), 
+        "pyrsig": integrity_stats()
+    }), 200
+
 @app.route("/get_pollutants", methods=["POST", "OPTIONS"])  
 def pollutant_score(): 
     if request.method == 'OPTIONS':
@@ -74,10 +162,16 @@ def pollutant_score():
         
         # Get bounding box
         bbox = set_bbox(latitude=latitude, longitude=longitude)
-        pollutants_data = get_pollutants(bbox)
-        pollutant_score = calculate_current_pollutants(pollutants_data)
+        score_scheduler.note_request(bbox)
+
+        # Precomputed by the scheduler when possible; a stale score is served
+        # right away while it is refreshed in the background
+        pollutant_score, age = pollutant_swr.get(score_scheduler.cell(bbox), lambda: get_pollutant_score(bbox))
 
-        response = pollutant_score 
+        response = {
+            "score": pollutant_score, 
+            "data_age_seconds": round(age, 1)
+        }
         return jsonify(response), 200
 
     except ValueError as e:
@@ -93,6 +187,42 @@ def pollutant_score():
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
     
 
+@app.route("/get_baseline", methods=["POST", "OPTIONS"])  
+def pollutant_baseline(): 
+    """
+    How each pollutant compares with the same time of year in the previous
+    PREVYRS years. Body: {"latitude": ..., "longitude": ..., "date": "YYYY-MM-DD"}
+    (date defaults to today, UTC). A lookup in the climatology store; cells
+    without history yet are filled in by the daily baseline_scheduler cycle.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:       
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        bbox = set_bbox(latitude=data.get('latitude'), longitude=data.get('longitude'))
+        date = data.get('date')
+        if date is not None: 
+            datetime.strptime(date, "%Y-%m-%d") # raises ValueError if malformed
+        baseline_scheduler.note_request(bbox)
+        
+        return jsonify({"baseline": get_baseline(bbox, date)}), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        print("=" * 50)
+        print(f'ERROR: Exception occurred - {str(e)}')
+        import traceback
+        traceback.print_exc()
+        print("=" * 50)
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+    
+
 @app.route("/get_data", methods=["POST", "OPTIONS"])  
 def backend_main(): 
     """Main endpoint that returns both AQI and weather data"""
@@ -115,21 +245,16 @@ def backend_main():
         # Get bounding box
         bbox = set_bbox(latitude=latitude, longitude=longitude)
         
-        # Get data
-        print("Fetching AQI data...")
-        aqi_data = get_aqi_data(bbox)
-        print(f"AQI: {aqi_data}")
-        
-        print("Fetching weather data...")
-        weather_data = get_weather_data(bbox)
-        print("Weather data fetched!")
+        # Served from data_swr when recent enough (stale entries refresh in the background)
+        result, age = data_swr.get(grid_key(bbox), lambda: fetch_data(bbox))
         
         response = {
-            "aqi": aqi_data,
-            "current_weather": weather_data
+            **result["response"],
+            "data_age_seconds": round(age, 1)
         }
         
-        return jsonify(response), 200  # Only jsonify at the endpoint level
+        # Per-source timings (of the fetch that produced this data) go in a header
+        return jsonify(response), 200, {"Server-Timing": server_timing_header(result["timings"])}  # Only jsonify at the endpoint level
 
     except ValueError as e:
         # Handle validation errors
@@ -146,6 +271,150 @@ def backend_main():
 
 
 
+@app.route("/get_data_batch", methods=["POST", "OPTIONS"])  
+def backend_batch(): 
+    """
+    AQI and weather for many points in one call. Expects
+    {"points": [{"latitude": ..., "longitude": ...}, ...]} and returns
+    {"results": [...]} with one {"latitude", "longitude", "aqi",
+    "current_weather"} entry per input point, in input order.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:       
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('points'), list) or not data['points']:
+            return jsonify({'error': 'A non-empty list of points is required'}), 400
+        
+        points = data['points']
+        if len(points) > MAX_BATCH_POINTS: 
+            return jsonify({'error': f'At most {MAX_BATCH_POINTS} points per request'}), 400
+        
+        # Validate every point first so the client gets all errors at once
+        bboxes = []
+        errors = {}
+        for i, point in enumerate(points): 
+            try: 
+                bboxes.append(set_bbox(latitude=point.get('latitude'), longitude=point.get('longitude')))
+            except (ValueError, AttributeError) as e: 
+                errors[i] = str(e)
+        if errors: 
+            return jsonify({'error': 'Invalid points', 'points': errors}), 400
+        
+        results, timings = fan_out({
+            "aqi": (get_aqi_batch, (bboxes,)),
+            "weather": (get_openmeteo_weather_batch, (bboxes,)),
+        })
+        print(f"Batch of {len(points)} points. Upstream timings: " + ", ".join(f"{name}={elapsed:.3f}s" for name, elapsed in timings.items()))
+        
+        response = {
+            "results": [
+                {
+                    "latitude": point['latitude'], 
+                    "longitude": point['longitude'], 
+                    "aqi": aqi, 
+                    "current_weather": weather
+                }
+                for point, aqi, weather in zip(points, results["aqi"], results["weather"])
+            ]
+        }
+        
+        return jsonify(response), 200, {"Server-Timing": server_timing_header(timings)}
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        print("=" * 50)
+        print(f'ERROR: Exception occurred - {str(e)}')
+        import traceback
+        traceback.print_exc()
+        print("=" * 50)
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+
+
+@app.route("/jobs", methods=["POST", "OPTIONS"])  
+def submit_job(): 
+    """
+    Start a long-running query and return its job id right away. Body:
+    {"type": "pollutants" | "pollutants_prevyrs", "latitude": ..., "longitude": ...,
+     "bdate": "YYYY-MM-DD", "edate": "YYYY-MM-DD", "prevyrs": int}
+    (dates and prevyrs only for pollutants_prevyrs; prevyrs is 1..MAX_PREVYRS
+    and the span at most MAX_JOB_DAYS). Poll GET /jobs/<job_id>.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:       
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        job_type = data.get('type')
+        bbox = set_bbox(latitude=data.get('latitude'), longitude=data.get('longitude'))
+        params = {'latitude': data.get('latitude'), 'longitude': data.get('longitude')}
+        
+        if job_type == 'pollutants': 
+            func = lambda progress: {"score": get_pollutant_score(bbox, progress=progress)}
+        elif job_type == 'pollutants_prevyrs': 
+            bdate = data.get('bdate')
+            if bdate is None: 
+                raise ValueError('bdate is required for pollutants_prevyrs')
+            edate = data.get('edate')
+            prevyrs = int(data.get('prevyrs', PREVYRS))
+            if not 1 <= prevyrs <= MAX_PREVYRS: 
+                raise ValueError(f'prevyrs must be between 1 and {MAX_PREVYRS}')
+            start = datetime.strptime(bdate, "%Y-%m-%d") # raises ValueError if malformed
+            end = start if edate is None else datetime.strptime(edate, "%Y-%m-%d")
+            if not 0 <= (end - start).days < MAX_JOB_DAYS: 
+                raise ValueError(f'edate must be on or after bdate, spanning at most {MAX_JOB_DAYS} days')
+            params.update({'bdate': bdate, 'edate': edate, 'prevyrs': prevyrs})
+            func = lambda progress: get_prevyrs_data(bbox, bdate, edate, prevyrs=prevyrs, progress=progress)
+        else: 
+            raise ValueError('type must be "pollutants" or "pollutants_prevyrs"')
+        
+        job, created = jobs.submit(job_type, params, func)
+        return jsonify(job.to_dict()), 202 if created else 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+        
+    except Exception as e:
+        print("=" * 50)
+        print(f'ERROR: Exception occurred - {str(e)}')
+        import traceback
+        traceback.print_exc()
+        print("=" * 50)
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])  
+def job_status(job_id): 
+    """Job status, per-step progress and, once done, the result. ?wait=N long-polls up to N seconds."""
+    try: 
+        wait = min(float(request.args.get('wait', 0)), MAX_JOB_WAIT)
+    except ValueError: 
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    job = jobs.get(job_id, wait=wait)
+    if job is None: 
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict()), 200
+
+
 if __name__ == "__main__":
 
+    # With the debug reloader on, only the reloaded child process serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        weather_warmer.start()
+        score_scheduler.start()
+        baseline_scheduler.start()
+        if USE_TILE_STORE: 
+            tile_refresher.start()
+
     app.run(debug=True, port=5001, host='127.0.0.1')
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import threading
+import pandas as pd
+
+# Add Backend folder to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from utils import data_getters
+
+# Runs _rsig_dataframe through rsig_flights and cached_download with RsigApi
+# replaced by a stand-in that writes one file into its workdir, so no
+# network access is needed. Run with pytest or as a script.
+
+
+class FakeRsigApi:
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def __init__(self, bdate, edate, bbox, workdir, gridfit=False):
+        self.workdir = workdir
+        self.tempo_kw = {}
+
+    def to_dataframe(self, product, **kwargs):
+        with FakeRsigApi.calls_lock:
+            FakeRsigApi.calls += 1
+        path = os.path.join(self.workdir, f"{product}.csv")
+        if not os.path.exists(path):
+            pd.DataFrame({
+                "time": ["2025-10-02T12:00:00"], "LONGITUDE": [-122.2], "LATITUDE": [49.2], "no2": [1.5]
+            }).to_csv(path, index=False)
+        return pd.read_csv(path, parse_dates=["time"])
+
+
+def test_rsig_dataframe_single_flight():
+    original = data_getters.pyrsig.RsigApi
+    data_getters.pyrsig.RsigApi = FakeRsigApi
+    FakeRsigApi.calls = 0
+    try:
+        workdir = tempfile.mkdtemp()
+        bbox = (-122.21, 49.19, -122.19, 49.21)
+        results = []
+
+        def fetch():
+            results.append(data_getters._rsig_dataframe(
+                "tempo.l2.no2.vertical_column_troposphere", bbox, "2025-10-02T00:00:00", "2025-10-02T23:59:59", workdir
+            ))
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 4
+        for df in results:
+            assert data_getters.value_column(df, "no2") == "no2"
+            assert df["no2"].iloc[0] == 1.5
+        # Each caller gets its own copy
+        assert len({id(df) for df in results}) == 4
+        # The download landed in the shared workdir, recorded in the manifest
+        assert os.path.exists(os.path.join(workdir, "tempo.l2.no2.vertical_column_troposphere.csv"))
+    finally:
+        data_getters.pyrsig.RsigApi = original
+
+
+if __name__ == "__main__":
+    test_rsig_dataframe_single_flight()
+    print("ok")
@@ -1,4 +1,8 @@
-import earthaccess
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from utils.granule_index import search_data
 
 BBOX = 0.1
 
@@ -15,7 +19,8 @@ print(bbox)
 min_date = input("Enter start date (format yyyy-mm-dd): ") #Dates can be datetime objects or ISO 8601 formatted strings. 
 max_date = input("Enter end date (format yyyy-mm-dd): ")
 
-results = earthaccess.search_data(
+# Answered from the local granule index (granule_index.sqlite) when this window was searched before
+results = search_data(
     #short_name='TEMPO_NO2_L2_V03',
     short_name="TEMPO_NO2_L2", 
     version="V04",  
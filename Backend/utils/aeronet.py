@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Reader for AERONET .lev20 site files (comma-separated, one row per
+# observation, sorted by time, after a few lines of preamble).
+#
+# Rows are parsed in chunks by pandas with only the needed columns and
+# vectorized date parsing. Without a sidecar, the reader binary-searches the
+# file by byte offset for the first row of the requested window and stops
+# after its last row. The first full read also writes a Parquet sidecar
+# (<file>.parquet) with every AOD column; later reads come from it with the
+# date window pushed down, until the .lev20 file changes.
+
+DATE_COLUMN = "Date(dd:mm:yyyy)"
+TIME_COLUMN = "Time(hh:mm:ss)"
+NAME_COLUMN = "AERONET_Site_Name"
+LAT_COLUMN = "Site_Latitude(Degrees)"
+LON_COLUMN = "Site_Longitude(Degrees)"
+DATE_FORMAT = "%d:%m:%Y"
+CHUNK_ROWS = 100_000
+SEEK_BLOCK = 64 * 1024  # bytes; the search stops narrowing below this and scans
+
+
+def _aod_column(wavelength):
+    return f"AOD_{wavelength:d}nm"
+
+
+def read_header(filename):
+    """
+    (columns, data_offset, site) of an AERONET file: the header fields, the
+    byte offset of the first data row, and the site's name/lat/lon.
+    """
+    with open(filename, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"No header line (containing 'Date') in {filename}")
+            if b"Date" in line:
+                columns = line.decode().rstrip("\r\n").split(",")
+                break
+        data_offset = f.tell()
+        first = f.readline().decode().rstrip("\r\n").split(",")
+
+    site = {}
+    if len(first) == len(columns):
+        site = {
+            "name": first[columns.index(NAME_COLUMN)],
+            "lat": float(first[columns.index(LAT_COLUMN)]),
+            "lon": float(first[columns.index(LON_COLUMN)]),
+        }
+    return columns, data_offset, site
+
+
+def _row_date(line):
+    return datetime.strptime(line.split(b",", 1)[0].decode(), DATE_FORMAT).date()
+
+
+def _seek(f, data_offset, start_date):
+    """
+    Byte offset of a row start at or before the first row dated `start_date`
+    or later, found by bisecting the (time-sorted) file.
+    """
+    lo = data_offset
+    hi = f.seek(0, os.SEEK_END)
+    while hi - lo > SEEK_BLOCK:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()  # skip the partial row
+        row_start = f.tell()
+        line = f.readline()
+        if line and row_start < hi and _row_date(line) < start_date:
+            lo = row_start
+        else:
+            hi = mid
+    return lo
+
+
+def _parse_chunk(chunk):
+    """Add a `time` column (UTC datetimes) parsed from the date and time fields."""
+    chunk.insert(0, "time", pd.to_datetime(chunk[DATE_COLUMN] + " " + chunk[TIME_COLUMN], format=f"{DATE_FORMAT} %H:%M:%S"))
+    return chunk
+
+
+def _read_rows(filename, columns, usecols, offset, start=None, end=None):
+    """Rows from `offset` on, parsed in chunks; stops after the first row past `end`."""
+    frames = []
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        reader = pd.read_csv(
+            f, header=None, names=columns, usecols=usecols, chunksize=CHUNK_ROWS,
+            dtype={DATE_COLUMN: str, TIME_COLUMN: str}, index_col=False,
+        )
+        for chunk in reader:
+            chunk = _parse_chunk(chunk)
+            if start is not None:
+                chunk = chunk[chunk["time"] >= start]
+            if end is not None:
+                past = chunk["time"] >= end
+                if past.any():
+                    frames.append(chunk[~past])
+                    break
+            frames.append(chunk)
+    if not frames:
+        return pd.DataFrame(columns=["time", *usecols])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _sidecar(filename):
+    return f"{filename}.parquet"
+
+
+def _sidecar_fresh(filename):
+    path = _sidecar(filename)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(filename)
+
+
+def write_sidecar(filename):
+    """Convert a whole .lev20 file (time, date/time strings, every AOD column) to its Parquet sidecar."""
+    columns, data_offset, site = read_header(filename)
+    usecols = [DATE_COLUMN, TIME_COLUMN] + [c for c in columns if c.startswith("AOD_") and c.endswith("nm")]
+    df = _read_rows(filename, columns, usecols, data_offset)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"aeronet_site": json.dumps(site).encode()})
+
+    path = _sidecar(filename)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def read_aeronet(filename, wavelengths, start_date, end_date, use_sidecar=True):
+    """
+    AOD at `wavelengths` between start_date and end_date (inclusive dates).
+
+    Parameters:
+    -----------
+    use_sidecar : bool
+        Read from (and on first use, create) the Parquet sidecar. If False,
+        seek in the .lev20 file and parse only the window.
+
+    Returns:
+    --------
+    (site, DataFrame) : site is {"name", "lat", "lon"}; the frame has `time`,
+    the date and time strings, and one AOD_<wl>nm column per wavelength
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + timedelta(days=1)
+    aod_columns = [_aod_column(wavelength) for wavelength in wavelengths]
+
+    if use_sidecar:
+        if not _sidecar_fresh(filename):
+            write_sidecar(filename)
+        path = _sidecar(filename)
+        site = json.loads(pq.read_schema(path).metadata[b"aeronet_site"])
+        table = pq.read_table(
+            path, columns=["time", DATE_COLUMN, TIME_COLUMN, *aod_columns],
+            filters=[("time", ">=", start), ("time", "<", end)],
+        )
+        return site, table.to_pandas()
+
+    columns, data_offset, site = read_header(filename)
+    missing = [c for c in aod_columns if c not in columns]
+    if missing:
+        raise ValueError(f"{filename} has no column(s) {missing}")
+    with open(filename, "rb") as f:
+        offset = _seek(f, data_offset, start.date())
+    df = _read_rows(filename, columns, [DATE_COLUMN, TIME_COLUMN, *aod_columns], offset, start, end)
+    return site, df
+
+
+def read_aeronet_mw(filename, wavelengths, start_date, end_date, use_sidecar=True):
+    """
+    Drop-in for the tutorial reader: (name, lat, lon, sorted wavelengths,
+    date_time, aod) where date_time is an (n, 2) array of date and time
+    strings and aod is (n, n_wavelengths), columns in sorted-wavelength order.
+    """
+    sorted_wavelengths = np.array(sorted(wavelengths))
+    site, df = read_aeronet(filename, sorted_wavelengths.tolist(), start_date, end_date, use_sidecar)
+
+    date_time = np.empty((len(df), 2), dtype=object)
+    date_time[:, 0] = df[DATE_COLUMN].to_numpy()
+    date_time[:, 1] = df[TIME_COLUMN].to_numpy()
+    aod = df[[_aod_column(wavelength) for wavelength in sorted_wavelengths]].to_numpy(dtype=np.float64)
+
+    return site.get("name"), site.get("lat"), site.get("lon"), sorted_wavelengths, date_time.astype(str), aod
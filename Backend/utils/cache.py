@@ -0,0 +1,116 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+import numpy as np
+
+# In-process caches for upstream results.
+
+OPENMETEO_CADENCE = 15 * 60  # Open-Meteo refreshes `current` every 15 minutes
+GRID = 0.01  # degrees; matches BBOX so one cache cell ~ one request box
+RETENTION_DAYS = 45  # days of pollutant data kept on disk (store partitions, tiles, raw RSIG downloads)
+
+
+def grid_key(bbox, grid=GRID):
+    """Snap the center of `bbox` to a `grid`-degree cell and return its integer indices."""
+    center_lat = (bbox[1] + bbox[3]) / 2
+    center_lon = (bbox[0] + bbox[2]) / 2
+    return (round(center_lat / grid), round(center_lon / grid))
+
+
+def next_boundary(cadence, now=None):
+    """Wall-clock time of the next multiple of `cadence` seconds."""
+    if now is None:
+        now = time.time()
+    return (now // cadence + 1) * cadence
+
+
+def approx_size(value):
+    """
+    Approximate bytes held by a cached value: array buffers plus containers,
+    recursively. Other objects are measured by sys.getsizeof, so classes
+    holding arrays (e.g. ForecastColumns) report their size in __sizeof__.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + sys.getsizeof(np.empty(0))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds (or at an
+    explicit expiry time). Holds at most `max_entries` items and, with
+    `max_bytes`, at most that many bytes of values (see approx_size); the
+    least recently used entry is evicted first.
+    """
+
+    def __init__(self, ttl, max_entries=1024, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()  # key -> (value, stored_at, expires_at, size)
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        self._bytes -= self._data.pop(key)[3]
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[2] <= time.time():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at=None):
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + self.ttl
+        size = approx_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, now, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def age(self, key):
+        """Seconds since `key` was stored, or None if it isn't cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else time.time() - entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes if self.max_bytes is not None else None,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
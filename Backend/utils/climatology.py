@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from datetime import date as date_cls, datetime, timedelta
+import json
+import math
+import os
+import threading
+import numpy as np
+import pandas as pd
+from utils.cache import GRID, grid_key
+from utils.pollutant_store import value_column
+from utils.singleflight import file_lock
+
+# Day-of-year climatology per (product, grid cell), kept on disk as
+#   <root>/<product>/<cell>.json
+# mapping "MM-DD" -> {"n", "mean", "m2", "values": {year: daily mean}}.
+#
+# Each ingested day updates its calendar day's running mean and sum of squared
+# deviations (Welford), so stats never have to be recomputed from raw data.
+# The per-year daily means are kept too (one number per year) for
+# percentiles; a year stored as null was fetched and had no data, so it isn't
+# fetched again. Days are calendar days in UTC, keyed "MM-DD" so Feb 29 never
+# shifts the rest of a leap year.
+
+CLIMATOLOGY_ROOT = "climatology_store"
+WINDOW_DAYS = 7  # baselines pool calendar days within +/- this many days
+PERCENTILES = (10, 50, 90)
+OPEN_CELLS = 1024  # (product, cell) stat files kept in memory
+
+
+def day_key(day):
+    """Calendar-day key ("MM-DD") of a date, datetime or YYYY-MM-DD string."""
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d")
+    return day.strftime("%m-%d")
+
+
+def _window_keys(key, window_days):
+    """Calendar-day keys within +/- window_days of `key`, wrapping at the year end."""
+    center = date_cls(2000, int(key[:2]), int(key[3:]))  # 2000 is a leap year
+    keys = []
+    for offset in range(-window_days, window_days + 1):
+        day = center + timedelta(days=offset)
+        if day.year != 2000:  # wrapped into Dec/Jan of the neighbouring year
+            day = day.replace(year=2000)
+        keys.append(day.strftime("%m-%d"))
+    return keys
+
+
+def _welford_add(stats, value):
+    stats['n'] += 1
+    delta = value - stats['mean']
+    stats['mean'] += delta / stats['n']
+    stats['m2'] += delta * (value - stats['mean'])
+
+
+def _combine(a, b):
+    """Pooled (n, mean, m2) of two running stats (Chan et al.)."""
+    n = a[0] + b[0]
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / n
+    return n, mean, a[2] + b[2] + delta * delta * a[0] * b[0] / n
+
+
+def daily_means(df):
+    """
+    Mean of the value column of an RSIG DataFrame per UTC day, as
+    {"YYYY-MM-DD": float}. The value column is the first float column that
+    isn't a coordinate.
+    """
+    if df is None or df.empty or 'time' not in df:
+        return {}
+    value = value_column(df)
+    if value is None:
+        return {}
+    days = pd.to_datetime(df['time'], utc=True).dt.strftime("%Y-%m-%d")
+    means = df[value].groupby(days).mean().dropna()
+    return {day: float(mean) for day, mean in means.items()}
+
+
+class ClimatologyStore:
+    """
+    Running day-of-year statistics of daily means per (product, grid cell).
+
+    `ingest` adds days as they arrive; `baseline` is a lookup.
+    Each (year, calendar day) is counted once, so ingesting overlapping
+    windows is harmless.
+    """
+
+    def __init__(self, root=CLIMATOLOGY_ROOT, grid=GRID):
+        self.root = root
+        self.grid = grid
+        self._cells = OrderedDict()  # (product, cell) -> (mtime, stats)
+        self._lock = threading.Lock()
+
+    def _path(self, product, cell):
+        return os.path.join(self.root, product, f"{cell[0]}_{cell[1]}.json")
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self, product, cell):
+        """Stats of one (product, cell), re-read only when the file changed."""
+        path = self._path(product, cell)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        key = (product, cell)
+        with self._lock:
+            entry = self._cells.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._cells.move_to_end(key)
+                return entry[1]
+        stats = self._read(path)
+        with self._lock:
+            self._cells[key] = (mtime, stats)
+            self._cells.move_to_end(key)
+            while len(self._cells) > OPEN_CELLS:
+                self._cells.popitem(last=False)
+        return stats
+
+    def _save(self, path, stats):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp, path)
+
+    def ingest(self, product, bbox, means, days=()):
+        """
+        Add daily means ({"YYYY-MM-DD": value}, e.g. from `daily_means`) to
+        the cell of `bbox`. Entries of `days` without a mean are recorded as
+        empty so they are not fetched again. Returns how many days were new.
+        """
+        cell = grid_key(bbox, self.grid)
+        path = self._path(product, cell)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        added = 0
+        with file_lock(f"{path}.lock"):
+            stats = self._read(path)
+            for day in sorted(set(means) | set(days)):
+                entry = stats.setdefault(day_key(day), {'n': 0, 'mean': 0.0, 'm2': 0.0, 'values': {}})
+                year = day[:4]
+                if year in entry['values']:
+                    continue
+                value = means.get(day)
+                if value is not None and math.isfinite(value):
+                    _welford_add(entry, value)
+                else:
+                    value = None
+                entry['values'][year] = value
+                added += 1
+            if added:
+                self._save(path, stats)
+        return added
+
+    def missing_days(self, product, bbox, days):
+        """The YYYY-MM-DD `days` not yet ingested for the cell of `bbox`."""
+        stats = self._load(product, grid_key(bbox, self.grid))
+        return [day for day in days if day[:4] not in stats.get(day_key(day), {}).get('values', {})]
+
+    def baseline(self, product, bbox, day, window_days=WINDOW_DAYS):
+        """
+        Climatology of `product` for the calendar day of `day` in the cell of
+        `bbox`, pooled over +/- window_days. Returns {"n", "mean", "std",
+        "p10", "p50", "p90"}; values are None when there isn't enough data.
+        """
+        stats = self._load(product, grid_key(bbox, self.grid))
+        pooled = (0, 0.0, 0.0)
+        values = []
+        for key in _window_keys(day_key(day), window_days):
+            entry = stats.get(key)
+            if entry is None:
+                continue
+            pooled = _combine(pooled, (entry['n'], entry['mean'], entry['m2']))
+            values.extend(v for v in entry['values'].values() if v is not None)
+
+        n, mean, m2 = pooled
+        out = {
+            "n": n,
+            "mean": mean if n else None,
+            "std": math.sqrt(m2 / (n - 1)) if n > 1 else None,
+        }
+        points = np.percentile(values, PERCENTILES) if values else [None] * len(PERCENTILES)
+        for p, point in zip(PERCENTILES, points):
+            out[f"p{p}"] = None if point is None else float(point)
+        return out
@@ -3,13 +3,51 @@ import earthaccess
 import pyrsig
 import pandas as pd
 import os
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np 
-import shutil 
+from numpy.lib.stride_tricks import sliding_window_view
+import time
 from utils.dtypes import ValidCoords
+from utils import http_client
+from utils.cache import TTLCache, grid_key, next_boundary, OPENMETEO_CADENCE
+from utils.forecast import ForecastColumns
+from utils.pollutant_store import PollutantStore, value_column
+from utils.rsig_cache import cached_download, is_corruption_error
+from utils.singleflight import SingleFlight
+from utils.tile_store import TileStore, TILE_PRODUCTS
+from utils.scoring import THRESHOLDS, overall_scores, recent_average
+from utils.climatology import ClimatologyStore, daily_means, WINDOW_DAYS
 
 BBOX = 0.01  # Moved to global scope
+POLLUTANT_WORKERS = 4  # default worker count for parallel get_pollutants
+WEATHER_GRID = BBOX  # degrees; weather requests whose centers share a cell share a cache entry
+WEATHER_CACHE_SIZE = 2048  # max cached (cell, forecast_hours) entries
+WEATHER_CACHE_BYTES = 64 * 1024 ** 2  # and at most this much memory
+OPENMETEO_BATCH_SIZE = 100  # max coordinates per multi-location Open-Meteo request
+AQI_CACHE_SIZE = 8192  # max cached (cell, day) hourly AQI arrays
+AQI_CACHE_BYTES = 16 * 1024 ** 2  # and at most this much memory
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+AQI_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+# Pollutants scored by get_pollutants -> RSIG product
+POLLUTANT_PRODUCTS = {
+    'no2': 'tempo.l2.no2.vertical_column_troposphere',
+    #'formaldehyde': 'tempo.l2.hcho.vertical_column_troposphere',
+    'hcho': 'tempo.l3.hcho.vertical_column', 
+    'o3': 'tempo.l2.o3tot.column_amount_o3', 
+    'pm25': 'airnow.pm25'
+}
+
+weather_cache = TTLCache(ttl=OPENMETEO_CADENCE, max_entries=WEATHER_CACHE_SIZE, max_bytes=WEATHER_CACHE_BYTES)
+# (cell, 'YYYY-MM-DD') -> hourly us_aqi for that local day. Past days keep for a
+# day; today's entry expires every hour as the forecast is updated.
+aqi_cache = TTLCache(ttl=24 * 3600, max_entries=AQI_CACHE_SIZE, max_bytes=AQI_CACHE_BYTES)
+aqi_utc_offsets = {}  # cell -> upstream UTC offset in seconds
+pollutant_store = PollutantStore()  # incremental, day-partitioned RSIG data for get_pollutants
+rsig_flights = SingleFlight()  # coalesces identical in-flight RSIG downloads
+tile_store = TileStore()  # gridded TEMPO tiles, filled by a TileRefresher (see backend.py)
+climatology = ClimatologyStore()  # day-of-year baselines, filled by update_climatology
 
 def set_bbox(latitude, longitude): 
     """Calculate bounding box from coordinates"""
@@ -32,7 +70,53 @@ def set_bbox(latitude, longitude):
     return bbox 
 
 
-def get_openmeteo_weather(bbox, forecast_hours=48):
+def get_openmeteo_weather(bbox, forecast_hours=48, use_cache=True, columnar=False, columns=None):
+    """
+    Cached front for `_fetch_openmeteo_weather`. Requests are keyed by the bbox
+    center snapped to WEATHER_GRID plus `forecast_hours`, and entries expire at
+    the next 15-minute Open-Meteo update. The returned dict is shared between
+    callers and must not be mutated. Hit/miss counts: `weather_cache.stats()`.
+
+    With columnar=True, 'forecast' is a ForecastColumns (datetime64 times, one
+    NumPy array per variable) instead of a list of per-hour dicts. `columns`
+    restricts the forecast to those variables (e.g. ['temp', 'humidity']).
+    """
+    if use_cache: 
+        key = (grid_key(bbox, WEATHER_GRID), forecast_hours)
+        weather = weather_cache.get(key)
+        if weather is None: 
+            weather = _fetch_openmeteo_weather(bbox, forecast_hours)
+            weather_cache.set(key, weather, expires_at=next_boundary(OPENMETEO_CADENCE))
+    else: 
+        weather = _fetch_openmeteo_weather(bbox, forecast_hours, columns)
+
+    return _weather_view(weather, columnar, columns)
+
+
+def get_current_weather(bbox): 
+    """
+    Current conditions only (the 'current' dict of get_openmeteo_weather),
+    fetched live without an hourly forecast. For refreshers that don't need
+    the forecast.
+    """
+    center_lat = (bbox[1] + bbox[3]) / 2
+    center_lon = (bbox[0] + bbox[2]) / 2
+    response = http_client.get(FORECAST_URL, params=_current_params(center_lat, center_lon))
+    return _parse_current(response.json())
+
+
+def _weather_view(weather, columnar=False, columns=None): 
+    """Present a parsed weather dict in the shape the caller asked for."""
+    forecast = weather['forecast']
+    if columns is not None: 
+        forecast = forecast.select(columns)
+    return {
+        'current': weather['current'],
+        'forecast': forecast if columnar else forecast.records()
+    }
+
+
+def _fetch_openmeteo_weather(bbox, forecast_hours=48, columns=None):
     """
     Get weather data from Open-Meteo (FREE, no API key!)
     Includes current conditions + forecast
@@ -43,10 +127,12 @@ def get_openmeteo_weather(bbox, forecast_hours=48):
         Location coordinates
     forecast_hours : int
         Hours of forecast (up to 384 hours = 16 days)
+    columns : list, optional
+        Forecast variables to keep (keys of FORECAST_FIELDS). Default all.
     
     Returns:
     --------
-    dict with current and forecast weather data. Units: 
+    dict with current weather and the forecast as ForecastColumns. Units: 
     Temperature - celsius 
     relative humidity - %
     surface_pressure - hPa 
@@ -61,42 +147,57 @@ def get_openmeteo_weather(bbox, forecast_hours=48):
     center_lat = (bbox[1] + bbox[3]) / 2
     center_lon = (bbox[0] + bbox[2]) / 2
     
-    # Parameters - request ALL the variables you need
-    params = {
-        'latitude': center_lat,
-        'longitude': center_lon,
-        'hourly': [
+    params = _weather_params(center_lat, center_lon, forecast_hours)
+    response = http_client.get(url, params=params)
+    data = response.json()
+    
+    return _parse_openmeteo_weather(data, forecast_hours, columns)
+
+
+def _current_params(latitude, longitude): 
+    """Open-Meteo query for current conditions only. latitude/longitude may be comma-separated lists."""
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'current': [
             'temperature_2m',
             'relative_humidity_2m',
-            'dew_point_2m',
             'precipitation',
             'surface_pressure',
             'cloud_cover',
             'wind_speed_10m',
-            'wind_direction_10m',
-            'wind_gusts_10m',
+            'wind_direction_10m'
         ],
-        'current': [
+        'temperature_unit': 'celsius',
+        'wind_speed_unit': 'ms',
+        'precipitation_unit': 'mm',
+        'timezone': 'auto',
+    }
+
+
+def _weather_params(latitude, longitude, forecast_hours): 
+    """Open-Meteo forecast query. latitude/longitude may be comma-separated lists."""
+    # Parameters - request ALL the variables you need
+    return {
+        **_current_params(latitude, longitude),
+        'hourly': [
             'temperature_2m',
             'relative_humidity_2m',
+            'dew_point_2m',
             'precipitation',
             'surface_pressure',
             'cloud_cover',
             'wind_speed_10m',
-            'wind_direction_10m'
+            'wind_direction_10m',
+            'wind_gusts_10m',
         ],
-        'temperature_unit': 'celsius',
-        'wind_speed_unit': 'ms',
-        'precipitation_unit': 'mm',
-        'timezone': 'auto',
         'forecast_days': min(16, (forecast_hours // 24) + 1)
     }
-    
-    response = requests.get(url, params=params)
-    data = response.json()
-    
-    # Parse current weather
-    current = {
+
+
+def _parse_current(data): 
+    """The 'current' block of an Open-Meteo response as a dict."""
+    return {
         'time': datetime.fromisoformat(data['current']['time']),
         'temp': data['current']['temperature_2m'],
         'humidity': data['current']['relative_humidity_2m'],
@@ -106,22 +207,14 @@ def get_openmeteo_weather(bbox, forecast_hours=48):
         'precipitation': data['current']['precipitation'],
         'cloud_cover': data['current']['cloud_cover']
     }
+
+
+def _parse_openmeteo_weather(data, forecast_hours, columns=None): 
+    """Turn one location's Open-Meteo forecast response into {'current', 'forecast': ForecastColumns}."""
+    current = _parse_current(data)
     
-    # Parse hourly forecast
-    hourly = data['hourly']
-    forecast = []
-    
-    for i in range(min(forecast_hours, len(hourly['time']))):
-        forecast.append({
-            'time': datetime.fromisoformat(hourly['time'][i]), 
-            'temp': hourly['temperature_2m'][i],
-            'humidity': hourly['relative_humidity_2m'][i],
-            'pressure': hourly['surface_pressure'][i],
-            'wind_speed': hourly['wind_speed_10m'][i],
-            'wind_direction': hourly['wind_direction_10m'][i],
-            'precipitation': hourly['precipitation'][i],
-            'cloud_cover': hourly['cloud_cover'][i]
-        })
+    # Parse hourly forecast column-wise
+    forecast = ForecastColumns.from_hourly(data['hourly'], forecast_hours, columns)
     
     return {
         'current': current,
@@ -129,62 +222,404 @@ def get_openmeteo_weather(bbox, forecast_hours=48):
     }
 
 
-def get_aqi(bbox, start_date, end_date=None, hour=None): 
+def _unique_cells(bboxes, grid): 
+    """
+    Group bboxes by grid cell. Returns (cells, centers) where cells[i] is the
+    cell of bboxes[i] and centers maps each distinct cell to one (lat, lon).
+    """
+    cells = []
+    centers = {}
+    for bbox in bboxes: 
+        cell = grid_key(bbox, grid)
+        cells.append(cell)
+        if cell not in centers: 
+            centers[cell] = ((bbox[1] + bbox[3]) / 2, (bbox[0] + bbox[2]) / 2)
+    return cells, centers
 
-    # API endpoint
-    center_lat = (bbox[1] + bbox[3]) / 2
-    center_lon = (bbox[0] + bbox[2]) / 2
-  
-    current_date = datetime.now().date() # gets according to the local time
 
+def _fetch_multi(url, centers, make_params): 
+    """
+    Query a multi-coordinate Open-Meteo endpoint for every (lat, lon) in
+    `centers` (cell -> center), OPENMETEO_BATCH_SIZE locations per request.
+    Returns cell -> that location's response dict.
+
+    A batch response that is an error, or doesn't hold exactly one result
+    per location, is not matched up by position; its locations are fetched
+    one at a time instead. A location that still fails raises ValueError.
+    """
+    cells = list(centers)
+    results = {}
+    for i in range(0, len(cells), OPENMETEO_BATCH_SIZE): 
+        chunk = cells[i:i + OPENMETEO_BATCH_SIZE]
+        latitude = ",".join(f"{centers[cell][0]:.4f}" for cell in chunk)
+        longitude = ",".join(f"{centers[cell][1]:.4f}" for cell in chunk)
+        data = http_client.get(url, params=make_params(latitude, longitude)).json()
+        if isinstance(data, dict) and not data.get('error'): # a single location comes back unwrapped
+            data = [data]
+        if _valid_multi(data, len(chunk)): 
+            results.update(zip(chunk, data))
+            continue
+
+        print(f"Open-Meteo batch of {len(chunk)} locations came back malformed ({_upstream_error(data)}); fetching one at a time")
+        for cell in chunk: 
+            lat, lon = centers[cell]
+            single = http_client.get(url, params=make_params(f"{lat:.4f}", f"{lon:.4f}")).json()
+            if not _valid_multi([single] if isinstance(single, dict) else single, 1): 
+                raise ValueError(f"Open-Meteo request for ({lat:.4f}, {lon:.4f}) failed: {_upstream_error(single)}")
+            results[cell] = single if isinstance(single, dict) else single[0]
+    return results
+
+
+def _valid_multi(data, n): 
+    """True if `data` is a list of n location results, none of them an error."""
+    return isinstance(data, list) and len(data) == n \
+        and all(isinstance(item, dict) and not item.get('error') for item in data)
+
+
+def _upstream_error(data): 
+    """Open-Meteo's error reason in a response, or a description of its shape."""
+    if isinstance(data, dict): 
+        return data.get('reason', 'error') if data.get('error') else "unexpected object"
+    if isinstance(data, list): 
+        return f"{len(data)} results"
+    return type(data).__name__
+
+
+def get_openmeteo_weather_batch(bboxes, forecast_hours=48): 
+    """
+    Weather for many bboxes at once. Bboxes whose centers fall in the same
+    WEATHER_GRID cell share one result; cached cells are served from
+    weather_cache and the rest are fetched with Open-Meteo's comma-separated
+    multi-coordinate form.
+
+    Returns:
+    --------
+    list : one get_openmeteo_weather-style dict per input bbox, in order
+    """
+    cells, centers = _unique_cells(bboxes, WEATHER_GRID)
+
+    weather = {}
+    missing = {}
+    for cell, center in centers.items(): 
+        cached = weather_cache.get((cell, forecast_hours))
+        if cached is None: 
+            missing[cell] = center
+        else: 
+            weather[cell] = cached
+
+    if missing: 
+        url = "https://api.open-meteo.com/v1/forecast"
+        fetched = _fetch_multi(url, missing, lambda lat, lon: _weather_params(lat, lon, forecast_hours))
+        expires_at = next_boundary(OPENMETEO_CADENCE)
+        for cell, data in fetched.items(): 
+            weather[cell] = _parse_openmeteo_weather(data, forecast_hours)
+            weather_cache.set((cell, forecast_hours), weather[cell], expires_at=expires_at)
+
+    return [_weather_view(weather[cell]) for cell in cells]
+
+
+def _aqi_days(start_date, end_date=None): 
+    """Every YYYY-MM-DD from start_date to end_date (inclusive)."""
     if end_date is None:
         end_date = start_date  
     
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date = datetime.strptime(end_date, "%Y-%m-%d")
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
 
-    if hour == None: 
-        if start_date == current_date: 
-            hour = datetime.now().hour  
 
-    # Convert back to standardized YYYY-MM-DD strings
-    start_date = start_date.strftime("%Y-%m-%d")
-    end_date = end_date.strftime("%Y-%m-%d")
+def _local_now(utc_offset): 
+    """Current wall-clock time at a location with the given UTC offset (seconds)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=utc_offset)
+
+
+def _local_today(cell, lon): 
+    """
+    Today's date (YYYY-MM-DD) at a cell, from the UTC offset upstream
+    reported for it, or guessed from the longitude until it has.
+    """
+    utc_offset = aqi_utc_offsets.get(cell)
+    if utc_offset is None: 
+        utc_offset = round(lon / 15) * 3600
+    return _local_now(utc_offset).strftime("%Y-%m-%d")
+
 
-    #url = "https://api.open-meteo.com/v1/air-quality" 
-    params = {
-        'latitude': center_lat, 
-        'longitude': center_lon, 
+def _aqi_params(latitude, longitude, start_date, end_date): 
+    return {
+        'latitude': latitude, 
+        'longitude': longitude, 
         'hourly': 'us_aqi', 
+        'timezone': 'auto', 
         'start_date': start_date, 
         'end_date': end_date 
     }
 
-    url = f"https://air-quality-api.open-meteo.com/v1/air-quality?latitude={center_lat}&longitude={center_lon}&start_date={start_date}&end_date={end_date}&hourly=us_aqi"
-    response = requests.get(url, params)
 
-    data = response.json()
-    us_aqi = data[0]['hourly']['us_aqi']
+def _store_aqi_days(cell, data): 
+    """Split one location's air-quality response into per-day arrays and cache them."""
+    utc_offset = data.get('utc_offset_seconds', 0)
+    aqi_utc_offsets[cell] = utc_offset
+    local_now = _local_now(utc_offset)
+    today = local_now.strftime("%Y-%m-%d")
+    next_hour = time.time() + (60 - local_now.minute) * 60 - local_now.second
+
+    times = data['hourly']['time']
+    values = np.array(data['hourly']['us_aqi'], dtype=np.float64) # null -> NaN
+    days = {}
+    for i, t in enumerate(times): 
+        days.setdefault(t[:10], []).append(i)
+
+    stored = {}
+    for day, idx in days.items(): 
+        stored[day] = values[idx[0]:idx[-1] + 1]
+        # Past days are final; today and later are still being updated
+        aqi_cache.set((cell, day), stored[day], expires_at=next_hour if day >= today else None)
+    return stored
+
+
+def _hourly_aqi(cells, centers, days): 
+    """
+    Hourly us_aqi for every cell over `days`, served from aqi_cache where
+    possible. Missing cells are fetched together, one request per chunk of
+    locations, covering the span of missing days. Returns cell -> array.
+    """
+    found = {cell: [aqi_cache.get((cell, day)) for day in days] for cell in centers}
+    missing = {cell: centers[cell] for cell, arrays in found.items() if any(a is None for a in arrays)}
+
+    if missing: 
+        missing_days = sorted({days[i] for cell in missing for i, a in enumerate(found[cell]) if a is None})
+        fetched = _fetch_multi(AQI_URL, missing, lambda lat, lon: _aqi_params(lat, lon, missing_days[0], missing_days[-1]))
+        for cell, data in fetched.items(): 
+            stored = _store_aqi_days(cell, data)
+            found[cell] = [a if a is not None else stored.get(day, np.array([])) for a, day in zip(found[cell], days)]
+
+    return {cell: np.concatenate(found[cell]) for cell in centers}
+
+
+def _summarize_aqi(us_aqi, cell, start_date, hour): 
+    """
+    AQI for `hour` of the first day if given, the current local hour if
+    `start_date` is today at the location, otherwise the range average.
+    """
+    if hour == None: 
+        local_now = _local_now(aqi_utc_offsets.get(cell, 0))
+        if start_date == local_now.strftime("%Y-%m-%d"): 
+            hour = local_now.hour  
 
     if hour is not None: 
-        return int(us_aqi[hour]) #current aqi 
+        value = us_aqi[hour] if hour < len(us_aqi) else np.nan
+        return None if np.isnan(value) else int(value) #current aqi 
     
-    else: 
-        accum = 0
-        for rating in us_aqi: 
-            accum += rating 
+    if len(us_aqi) == 0 or np.all(np.isnan(us_aqi)): 
+        return None
+    return int(np.nanmean(us_aqi)) #average aqi over specified range 
 
-        return int(accum / len(us_aqi)) #average aqi over specified range 
-    
-def get_pollutants(bbox, bdate=None, locname="pyrsig_cache", months=1): 
-
-    pollutants = {
-        'no2': 'tempo.l2.no2.vertical_column_troposphere',
-        #'formaldehyde': 'tempo.l2.hcho.vertical_column_troposphere',
-        'hcho': 'tempo.l3.hcho.vertical_column', 
-        'o3': 'tempo.l2.o3tot.column_amount_o3', 
-        'pm25': 'airnow.pm25'
+
+def _aqi_today(centers, hour): 
+    """
+    AQI for the current local day of each cell, one upstream request per
+    distinct day. Where a guessed UTC offset picked the wrong day, the cell
+    is looked up again once upstream has reported its real offset.
+    """
+    aqi = {}
+    pending = centers
+    for attempt in range(2): 
+        by_day = {}
+        for cell, center in pending.items(): 
+            by_day.setdefault(_local_today(cell, center[1]), {})[cell] = center
+        retry = {}
+        for day, group in by_day.items(): 
+            for cell, us_aqi in _hourly_aqi(list(group), group, [day]).items(): 
+                if attempt == 0 and _local_today(cell, group[cell][1]) != day: 
+                    retry[cell] = group[cell]
+                else: 
+                    aqi[cell] = _summarize_aqi(us_aqi, cell, day, hour)
+        pending = retry
+        if not pending: 
+            break
+    return aqi
+
+
+def get_aqi(bbox, start_date=None, end_date=None, hour=None): 
+    """
+    US AQI from Open-Meteo's air-quality API.
+
+    Hourly values are cached per grid cell and local day, so repeat requests
+    for the same cell (e.g. the next hour) are answered from memory. Dates and
+    the current hour are in the location's timezone as reported upstream;
+    without start_date, the location's current day is used.
+
+    Returns:
+    --------
+    int : AQI at `hour` (or the current hour if start_date is today), else the
+    mean over start_date..end_date. None if upstream has no value.
+    """
+    cells, centers = _unique_cells([bbox], WEATHER_GRID)
+    if start_date is None: 
+        return _aqi_today(centers, hour)[cells[0]]
+    days = _aqi_days(start_date, end_date)
+    us_aqi = _hourly_aqi(cells, centers, days)[cells[0]]
+
+    return _summarize_aqi(us_aqi, cells[0], days[0], hour)
+
+
+def get_aqi_stats(bbox, start_date, end_date=None, window=8): 
+    """
+    Summary statistics of hourly AQI over start_date..end_date.
+
+    Parameters:
+    -----------
+    window : int
+        Rolling-mean window in hours (EPA uses 8 h for ozone).
+
+    Returns:
+    --------
+    dict with 'mean', 'max' and 'rolling_mean' (one value per full window;
+    None where a window has no data).
+    """
+    cells, centers = _unique_cells([bbox], WEATHER_GRID)
+    us_aqi = _hourly_aqi(cells, centers, _aqi_days(start_date, end_date))[cells[0]]
+
+    if len(us_aqi) == 0 or np.all(np.isnan(us_aqi)): 
+        return {'mean': None, 'max': None, 'rolling_mean': []}
+
+    rolling = []
+    if len(us_aqi) >= window: 
+        windows = sliding_window_view(us_aqi, window)
+        valid = np.sum(~np.isnan(windows), axis=1)
+        sums = np.nansum(windows, axis=1)
+        rolling = [None if n == 0 else float(total / n) for total, n in zip(sums, valid)]
+
+    return {
+        'mean': float(np.nanmean(us_aqi)),
+        'max': float(np.nanmax(us_aqi)),
+        'rolling_mean': rolling
     }
+
+
+def get_aqi_batch(bboxes, start_date=None, end_date=None, hour=None): 
+    """
+    get_aqi for many bboxes using Open-Meteo's multi-coordinate form. Bboxes
+    in the same WEATHER_GRID cell share one upstream location, and cells
+    already in aqi_cache are not fetched again. Without start_date, each
+    location's current day is used.
+
+    Returns:
+    --------
+    list : one AQI value per input bbox, in order
+    """
+    cells, centers = _unique_cells(bboxes, WEATHER_GRID)
+    if start_date is None: 
+        aqi = _aqi_today(centers, hour)
+        return [aqi[cell] for cell in cells]
+    days = _aqi_days(start_date, end_date)
+    hourly = _hourly_aqi(cells, centers, days)
+    aqi = {cell: _summarize_aqi(us_aqi, cell, days[0], hour) for cell, us_aqi in hourly.items()}
+
+    return [aqi[cell] for cell in cells]
+
+    
+def _rsig_dataframe(product, bbox, bdate, edate, workdir, api_key='none', gridfit=False, **df_kw): 
+    """
+    Download one RSIG product for bbox and bdate..edate into workdir. Files
+    are staged and verified by rsig_cache, so a corrupt download is
+    quarantined and re-fetched once instead of poisoning the workdir.
+
+    Concurrent calls for the same (product, bbox, dates) share one download
+    in this process, and are serialized across processes by a lock file in
+    the workdir. Each caller gets its own copy of the DataFrame.
+    """
+    key = repr((product, tuple(bbox), str(bdate), str(edate), api_key, gridfit, sorted(df_kw.items())))
+
+    def download(staging): 
+        rsigapi = pyrsig.RsigApi(bdate=bdate, edate=edate, bbox=bbox, workdir=staging, gridfit=gridfit)
+        rsigapi.tempo_kw['api_key'] = api_key
+        return rsigapi.to_dataframe(
+            product,
+            unit_keys=False, parse_dates=True, **df_kw
+        )
+
+    df = rsig_flights.do((workdir, key), cached_download, workdir, download, key=key)
+    return df.copy()
+
+
+def _fetch_pollutant(key, value, bbox, bdate, edate, workdir, store=None, tiles=None): 
+    """
+    Retrieve one product from RSIG into its own workdir. Returns the data
+    column, or None if the product could not be retrieved. With a
+    PollutantStore, only the days missing from the store are downloaded.
+    With a TileStore, gridded TEMPO products are read from local tiles.
+    """
+    try: 
+        if tiles is not None and value in TILE_PRODUCTS: 
+            center_lat = (bbox[1] + bbox[3]) / 2
+            center_lon = (bbox[0] + bbox[2]) / 2
+            series = tiles.lookup(value, center_lon, center_lat, bdate, edate)
+            print(f"{key}: {len(series)} hours from tile store")
+            return series if len(series) else None
+
+        print(f"adding data from {bdate} to {edate} for {key}.\n")
+        if store is None: 
+            tempodf = _rsig_dataframe(value, bbox, bdate, edate, workdir, verbose=9)
+        else: 
+            tempodf = store.get_window(
+                value, bbox, bdate, edate,
+                lambda cell_bbox, start, end: _rsig_dataframe(value, cell_bbox, start, end, workdir, verbose=9)
+            )
+        print(f"{key} Dataframe: ", tempodf[:-10])
+        print("Dataframe length: ", len(tempodf))
+        data_col = value_column(tempodf, key)
+        if data_col is None:
+            raise ValueError(f"No value column for {key} in {list(tempodf.columns)}")
+        print("grabbing data from column ", data_col)
+        return tempodf[data_col]
+
+    except Exception as e:
+        print(f"Error processing {key}: {e}")
+        
+        # Corrupt files were already quarantined (and retried) by rsig_cache
+        if is_corruption_error(e):
+            print(f"Corrupted file persisted for {key}, skipping...")
+        else:
+            print(f"Non-gzip error for {key}, skipping...")
+        return None
+
+
+def get_pollutants(bbox, bdate=None, locname="pyrsig_cache", months=1, parallel=False, max_workers=POLLUTANT_WORKERS, use_store=False, use_tiles=False, progress=None): 
+    """
+    Fetch TEMPO and AirNow pollutant data for a bounding box.
+
+    Parameters:
+    -----------
+    bbox : tuple
+        Bounding box as (min_lon, min_lat, max_lon, max_lat)
+    bdate : datetime, optional
+        Start of the window. Defaults to `months` months ago.
+    locname : str
+        pyrsig working directory.
+    months : int
+        Length of the default window in months.
+    parallel : bool
+        If True, retrieve all products concurrently. Each product then gets
+        its own workdir under `locname` so downloads don't collide.
+    max_workers : int
+        Number of concurrent retrievals in parallel mode.
+    use_store : bool
+        If True, serve the window from `pollutant_store` (UTC, partitioned by
+        product/day/grid cell) and download only the missing days.
+    use_tiles : bool
+        If True, read TEMPO products from `tile_store` (an O(1) grid lookup,
+        no download). AirNow still goes through RSIG. The tiles must be kept
+        current by a TileRefresher.
+    progress : callable, optional
+        Called as progress(pollutant, "done" | "failed") as each product
+        finishes (used by the job API).
+
+    Returns:
+    --------
+    dict : pollutant -> [data column], or [None] if that product failed
+    """
+    pollutants = POLLUTANT_PRODUCTS
     pollutants_data = {
         "no2": [], 
         "hcho": [], 
@@ -192,106 +627,61 @@ def get_pollutants(bbox, bdate=None, locname="pyrsig_cache", months=1):
         "pm25": []
     }
 
+    # The stores partition by UTC day, so their window is in UTC
+    now = datetime.now(timezone.utc) if use_store or use_tiles else datetime.now()
+    store = pollutant_store if use_store else None
+    tiles = tile_store if use_tiles else None
+
     if bdate==None: 
-        bdate = datetime.now() - relativedelta(months=months)
+        bdate = now - relativedelta(months=months)
     
-    edate=datetime.now().isoformat(timespec='seconds')
-    rsigapi = pyrsig.RsigApi(bdate=bdate, edate=edate, bbox=bbox, workdir="pyrsig_cache")
-    tkey = 'none'
-    rsigapi.tempo_kw['api_key'] = tkey
-
-    for key, value in pollutants.items(): 
-        try: 
-            print(f"adding data from {bdate} to {edate} for {key}.\n")
-            tempodf = rsigapi.to_dataframe(
-                value,
-                unit_keys=False, parse_dates=True, verbose=9
-            )
-            print(f"{key} Dataframe: ", tempodf[:-10])
-            print("Dataframe length: ", len(tempodf))
-            cols = tempodf.filter(like=f"key").columns
-
-            data_col = cols[0]
-            print("grabbing data from column ", data_col)
-            pollutants_data[key].append(tempodf[data_col])
-
-            
-        except Exception as e:
-            print(f"Error processing {key}: {e}")
-            
-            # Check if it's a gzip error (corrupted download)
-            if "gzip" in str(e).lower() or "not a gzipped file" in str(e).lower():
-                print(f"Corrupted file detected for {key}, clearing cache...")
-                
-                # Remove the entire cache directory and recreate it
-                if os.path.exists(locname) and os.path.isdir(locname):
-                    try:
-                        shutil.rmtree(locname)  # Remove directory and all contents
-                        os.makedirs(locname)  # Recreate empty directory
-                        print(f"Cleared cache directory: {locname}")
-                    except Exception as cleanup_error:
-                        print(f"Failed to clear cache: {cleanup_error}")
-                
-                pollutants_data[key].append(None)
-            else:
-                print(f"Non-gzip error for {key}, skipping...")
-                pollutants_data[key].append(None)
+    edate=now.isoformat(timespec='seconds')
+
+    def fetch(key, value, workdir): 
+        data = _fetch_pollutant(key, value, bbox, bdate, edate, workdir, store, tiles)
+        if progress is not None: 
+            progress(key, "done" if data is not None else "failed")
+        return data
+
+    if parallel: 
+        with ThreadPoolExecutor(max_workers=max_workers) as executor: 
+            futures = {
+                key: executor.submit(fetch, key, value, os.path.join(locname, key))
+                for key, value in pollutants.items()
+            }
+            for key, future in futures.items(): 
+                pollutants_data[key].append(future.result())
+    else: 
+        for key, value in pollutants.items(): 
+            pollutants_data[key].append(fetch(key, value, locname))
     
     return pollutants_data
 
 
 def calculate_current_pollutants(pollutants): #all pollutants are dataframes. dict --> key, df 
+    """
+    Overall score for one location from get_pollutants output. Each
+    pollutant is rated on its mean over the last 10 readings (see
+    utils/scoring.THRESHOLDS); pollutants with no data are left out.
 
-    GOOD = 3
-    FAIR = 2
-    POOR = 1
-
-    avg_data = {} 
-    results = {}
-
+    Returns:
+    --------
+    float : sum of ratings / best possible sum (1.0 = all good), or None if
+    no pollutant has data
+    """
+    names = []
+    averages = []
     for pollutant, _data in pollutants.items(): 
-        if _data == None:  
-            del pollutants[pollutant]
-        else: 
-            avg = _data[:-10]/10 
-            avg_data[pollutant] = avg 
-    
-    MAX_SCORE = len(avg_data) * GOOD 
-
-    #calculate ratings: 
-    for pollutant, avg in avg_data.items(): 
-        if pollutant == "no2": 
-            if avg <= 5e15: 
-                results["no2"] = GOOD
-            elif avg <= 1e16: 
-                results["no2"] = FAIR 
-            else: 
-                results["no2"] = POOR
-        elif pollutant == "pm25": 
-            if avg <= 12: 
-                results["pm25"] = GOOD 
-            elif avg <= 35: 
-                results["pm25"] = FAIR 
-            else: 
-                results["pm25"] = POOR  
-        elif pollutant == "o3": 
-            if avg < 250: 
-                results['o3'] = POOR 
-            elif avg < 300: 
-                results['o3'] = FAIR 
-            else: 
-                results['o3'] = GOOD
-        elif pollutant == "hcho": 
-            if avg > 6e16: 
-                results["hcho"] = POOR 
-            elif avg > 2e16: 
-                results["hcho"] = FAIR 
-            else: 
-                results["hcho"] = GOOD
-
-    total = sum(value for value in results.values() if isinstance(value, int)) / len(results)
-
-    return total/MAX_SCORE
+        if isinstance(_data, list): # get_pollutants wraps each column in a list
+            _data = _data[0] if _data else None
+        if pollutant in THRESHOLDS: 
+            names.append(pollutant)
+            averages.append(recent_average(_data))
+
+    if not names: 
+        return None
+    total = overall_scores([averages], names)[0]
+    return None if np.isnan(total) else float(total)
     
     #units: 
     #no2 = (molecules/cm2)
@@ -347,10 +737,45 @@ def rate_aqi(aqi):
 
 
 
+def _shift_years(date, years):
+    """date moved back `years` years; Feb 29 becomes Feb 28 in non-leap years."""
+    try:
+        return date.replace(year=date.year - years)
+    except ValueError:
+        return date.replace(year=date.year - years, day=28)
+
+
+def plan_prevyrs(bdate, edate=None, prevyrs=None):
+    """
+    One (year, bdate, edate) download window per year for get_pollutants_prevyrs:
+    the bdate..edate range itself plus the same range in each of the previous
+    `prevyrs` years, oldest first. Windows span whole days.
+    """
+    if edate is None:
+        edate = bdate
+    start = datetime.strptime(bdate, "%Y-%m-%d")
+    end = datetime.strptime(edate, "%Y-%m-%d")
+
+    windows = []
+    for year_offset in range(prevyrs or 0, -1, -1):  # Goes from prevyrs down to 0
+        window_start = _shift_years(start, year_offset)
+        window_end = _shift_years(end, year_offset)
+        windows.append((
+            window_start.year,
+            window_start.strftime("%Y-%m-%dT00:00:00"),
+            window_end.strftime("%Y-%m-%dT23:59:59")
+        ))
+    return windows
+
+
 #Gets pollutant data from NASA's TEMPO and AirNow (US only)
-def get_pollutants_prevyrs(bbox, bdate, edate=None, prevyrs=None, locname="pyrsig_cache"):
+def get_pollutants_prevyrs(bbox, bdate, edate=None, prevyrs=None, locname="pyrsig_cache", progress=None, max_workers=POLLUTANT_WORKERS):
     """
     Fetch and process TEMPO and AirNow air quality data for a date range.
+
+    Each year's range is fetched with one request per product, and the
+    year x product requests run on a bounded thread pool. Downloads stay in
+    the shared cache (locname) so repeated ranges are not downloaded again.
     
     Parameters:
     -----------
@@ -366,101 +791,64 @@ def get_pollutants_prevyrs(bbox, bdate, edate=None, prevyrs=None, locname="pyrsi
         data for 2025-10-02, 2024-10-02, 2023-10-02, and 2022-10-02.
     locname : str, optional
         Location name for working directory. If None, uses date range as name.
+    progress : callable, optional
+        Called as progress("<year> <source>_<pollutant>", status) after each
+        download, status being "done", "empty" or "missing".
+    max_workers : int
+        Number of downloads run at once.
         
     Returns:
     --------
     dict : Dictionary containing pollutant data with year labels
     """  
-    if edate is None:
-        edate = bdate
-    
-    # Generate base date list
-    start = datetime.strptime(bdate, "%Y-%m-%d")
-    end = datetime.strptime(edate, "%Y-%m-%d")
-    base_dates = []
-    current = start
-    while current <= end:
-        base_dates.append(current)
-        current += timedelta(days=1)
-    
-    # If prevyrs is specified, create dates for previous years
-    all_dates = []
-    if prevyrs:
-        for year_offset in range(prevyrs, -1, -1):  # Goes from prevyrs down to 0
-            for date in base_dates:
-                # Subtract years from the date
-                prev_date = date.replace(year=date.year - year_offset)
-                all_dates.append(prev_date)
-    else:
-        all_dates = base_dates
+    windows = plan_prevyrs(bdate, edate, prevyrs)
+    print("Download windows: ", windows)
     
-    # Convert to string format
-    date_list = [d.strftime("%Y-%m-%d") for d in all_dates]
-    print("Date list: ", date_list)
-    
-    # TEMPO pollutants to fetch
-    tempo_products = {
-        'no2': 'tempo.l2.no2.vertical_column_troposphere',
-        'formaldehyde': 'tempo.l2.hcho.vertical_column_troposphere',
-        'ozone': 'tempo.l2.o3.vertical_column_troposphere'
+    # TEMPO satellite and AirNow ground products to fetch: name -> (product, extra to_dataframe options)
+    products = {
+        'tempo_no2': ('tempo.l2.no2.vertical_column_troposphere', {'backend': 'xdr'}),
+        'tempo_formaldehyde': ('tempo.l2.hcho.vertical_column_troposphere', {'backend': 'xdr'}),
+        'tempo_ozone': ('tempo.l2.o3.vertical_column_troposphere', {'backend': 'xdr'}),
+        'airnow_pm25': ('airnow.pm25', {}),
+        'airnow_ozone': ('airnow.ozone', {}),
+        'airnow_no2': ('airnow.no2', {}),
     }
+
+    def fetch(name, product, df_kw, year, window_bdate, window_edate):
+        try:
+            df = _rsig_dataframe(product, bbox, window_bdate, window_edate, locname, api_key="anonymous", gridfit=True, **df_kw)
+        except Exception as e:
+            print(f"Missing {name} for {year}: {e}")
+            if progress is not None:
+                progress(f"{year} {name}", "missing")
+            return None
+        if progress is not None:
+            progress(f"{year} {name}", "empty" if df.empty else "done")
+        if df.empty:
+            return None
+        # Add year column to track which year this data is from
+        df['year'] = year
+        print(f"{name} {year}: {len(df)} records")
+        return df
     
     # Store data for each pollutant
-    all_data = {pollutant: [] for pollutant in tempo_products.keys()}
-    airnow_data = {'pm25': [], 'ozone': [], 'no2': []}
-    
-    # Loop through dates
-    for date in date_list:
-        print(f"\nFetching data for {date}...")
-        cache_dir = "pyrsig_cache"
-        if os.path.exists(cache_dir):
-            shutil.rmtree(cache_dir)
-
-        api = pyrsig.RsigApi(bdate=date, bbox=bbox, workdir=locname, gridfit=True)
-        api.tempo_kw["api_key"] = "anonymous"
-        
-        # Get TEMPO satellite data
-        for pollutant, key in tempo_products.items():
-            try:
-                df = api.to_dataframe(key, unit_keys=False, parse_dates=True, backend="xdr")
-                if not df.empty:
-                    # Add year column to track which year this data is from
-                    df['year'] = datetime.strptime(date, "%Y-%m-%d").year
-                    all_data[pollutant].append(df)
-                    print(f"TEMPO {pollutant}: {len(df)} records")
-            except Exception as e:
-                print(f"Missing TEMPO {pollutant}: {e}")
-        
-        # Get AirNow ground data
-        airnow_products = {
-            'pm25': 'airnow.pm25',
-            'ozone': 'airnow.ozone',
-            'no2': 'airnow.no2'
-        }
-        
-        for pollutant, key in airnow_products.items():
-            try:
-                df = api.to_dataframe(key, unit_keys=False, parse_dates=True)
-                if not df.empty:
-                    # Add year column
-                    df['year'] = datetime.strptime(date, "%Y-%m-%d").year
-                    airnow_data[pollutant].append(df)
-                    print(f"AirNow {pollutant}: {len(df)} records")
-            except Exception as e:
-                print(f"Missing AirNow {pollutant}: Not available")
+    all_data = {name: [] for name in products}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (name, executor.submit(fetch, name, product, df_kw, year, window_bdate, window_edate))
+            for year, window_bdate, window_edate in windows
+            for name, (product, df_kw) in products.items()
+        ]
+        for name, future in futures:
+            df = future.result()
+            if df is not None:
+                all_data[name].append(df)
     
-    # Combine data for each pollutant
+    # Combine data for each pollutant - one concat each
     combined_data = {}
-    
-    for pollutant in tempo_products.keys():
-        if all_data[pollutant]:
-            combined_data[f'tempo_{pollutant}'] = pd.concat(all_data[pollutant], ignore_index=True)
-            combined_data[f'tempo_{pollutant}'] = combined_data[f'tempo_{pollutant}'].sort_values(['year', 'time'])
-    
-    for pollutant in airnow_products.keys():
-        if airnow_data[pollutant]:
-            combined_data[f'airnow_{pollutant}'] = pd.concat(airnow_data[pollutant], ignore_index=True)
-            combined_data[f'airnow_{pollutant}'] = combined_data[f'airnow_{pollutant}'].sort_values(['year', 'time'])
+    for name, frames in all_data.items():
+        if frames:
+            combined_data[name] = pd.concat(frames, ignore_index=True).sort_values(['year', 'time'])
     
     # Summary
     print(f"\n{'='*60}")
@@ -483,9 +871,81 @@ def get_pollutants_prevyrs(bbox, bdate, edate=None, prevyrs=None, locname="pyrsi
     
 
 
+def _day_runs(days): 
+    """Split sorted YYYY-MM-DD strings into runs of consecutive days."""
+    runs = []
+    for day in days: 
+        if runs and datetime.strptime(runs[-1][-1], "%Y-%m-%d") + timedelta(days=1) == datetime.strptime(day, "%Y-%m-%d"): 
+            runs[-1].append(day)
+        else: 
+            runs.append([day])
+    return runs
 
 
+def update_climatology(bbox, day=None, prevyrs=5, window_days=WINDOW_DAYS, locname="pyrsig_cache", max_workers=POLLUTANT_WORKERS): 
+    """
+    Bring the climatology of the cell of `bbox` up to date for `day`
+    (default today, UTC): the +/- window_days around it in each of the
+    previous `prevyrs` years, so baselines only describe prior years.
 
+    Only days the climatology hasn't seen are downloaded, so after the first
+    call a daily update fetches about one new day per year and product.
+    Returns the number of (product, day) entries added.
+    """
+    if day is None: 
+        day = datetime.now(timezone.utc).date()
+    elif isinstance(day, str): 
+        day = datetime.strptime(day, "%Y-%m-%d").date()
+    wanted = set()
+    for year_offset in range(1, prevyrs + 1): 
+        center = _shift_years(day, year_offset)
+        wanted.update(center + timedelta(days=offset) for offset in range(-window_days, window_days + 1))
+    days = sorted(d.strftime("%Y-%m-%d") for d in wanted)
+
+    cell_bbox = pollutant_store.cell_bbox(grid_key(bbox, climatology.grid))
+    workdir = os.path.join(locname, "climatology")
+
+    def fetch(product, run): 
+        try: 
+            df = _rsig_dataframe(product, cell_bbox, f"{run[0]}T00:00:00", f"{run[-1]}T23:59:59", workdir)
+        except Exception as e: 
+            print(f"Climatology fetch of {product} {run[0]}..{run[-1]} failed: {e}")
+            return 0 # not recorded, so retried on the next update
+        return climatology.ingest(product, cell_bbox, daily_means(df), days=run)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor: 
+        futures = [
+            executor.submit(fetch, product, run)
+            for product in POLLUTANT_PRODUCTS.values()
+            for run in _day_runs(climatology.missing_days(product, cell_bbox, days))
+        ]
+        added = sum(future.result() for future in futures)
+
+    if added: 
+        print(f"Climatology for {grid_key(bbox, climatology.grid)}: added {added} days")
+    return added
+
+
+def get_baseline(bbox, day=None, window_days=WINDOW_DAYS): 
+    """
+    Day-of-year baseline of each pollutant for the cell of `bbox` (a
+    lookup; see update_climatology). Where pollutant_store already holds
+    data for `day`, its daily mean and standard score are included.
 
-
-
+    Returns:
+    --------
+    dict : pollutant -> {"n", "mean", "std", "p10", "p50", "p90", "value", "z"}
+    """
+    if day is None: 
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    baselines = {}
+    for key, product in POLLUTANT_PRODUCTS.items(): 
+        base = climatology.baseline(product, bbox, day, window_days)
+        stored = pollutant_store.read_stored(product, bbox, f"{day}T00:00:00", f"{day}T23:59:59")
+        value = daily_means(stored).get(day)
+        z = None
+        if value is not None and base['std']: 
+            z = (value - base['mean']) / base['std']
+        baselines[key] = {**base, "value": value, "z": z}
+    return baselines
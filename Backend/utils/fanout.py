@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+MAX_WORKERS = 8  # upper bound on concurrent upstream calls across all requests
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fanout")
+
+
+def _timed_call(func, args):
+    start = time.perf_counter()
+    try:
+        return func(*args), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def fan_out(calls, timeout=None):
+    """
+    Run several independent upstream calls concurrently on a shared, bounded
+    thread pool. Total latency is that of the slowest call instead of the sum.
+
+    Parameters:
+    -----------
+    calls : dict
+        name -> (func, args) pairs, e.g. {"aqi": (get_aqi_data, (bbox,))}
+    timeout : float, optional
+        Seconds to wait for each result before giving up.
+
+    Returns:
+    --------
+    (results, timings) : results maps name -> return value; timings maps
+    name -> seconds spent in that call. If any call raised, the first
+    exception (in `calls` order) is re-raised once all calls have finished.
+    """
+    futures = {name: _executor.submit(_timed_call, func, args) for name, (func, args) in calls.items()}
+
+    results = {}
+    timings = {}
+    errors = []
+    for name, future in futures.items():
+        value, error, elapsed = future.result(timeout=timeout)
+        results[name] = value
+        timings[name] = elapsed
+        if error is not None:
+            errors.append(error)
+
+    if errors:
+        raise errors[0]
+
+    return results, timings
+
+
+def server_timing_header(timings):
+    """Format per-source timings (seconds) as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings.items())
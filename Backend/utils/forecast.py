@@ -0,0 +1,89 @@
+from datetime import datetime
+import sys
+import numpy as np
+
+# Output name -> Open-Meteo hourly variable
+FORECAST_FIELDS = {
+    'temp': 'temperature_2m',
+    'humidity': 'relative_humidity_2m',
+    'pressure': 'surface_pressure',
+    'wind_speed': 'wind_speed_10m',
+    'wind_direction': 'wind_direction_10m',
+    'precipitation': 'precipitation',
+    'cloud_cover': 'cloud_cover',
+}
+
+
+class ForecastColumns:
+    """
+    Hourly forecast stored column-wise: `time` is a datetime64 array and every
+    variable is one float array (missing values are NaN). `records()` gives the
+    original list-of-dicts shape, built on first use.
+    """
+
+    def __init__(self, time, columns):
+        self.time = time
+        self.columns = columns
+        self._records = None
+
+    @classmethod
+    def from_hourly(cls, hourly, forecast_hours, columns=None):
+        """
+        Build from Open-Meteo's `hourly` block, keeping the first
+        `forecast_hours` hours and only the variables named in `columns`
+        (keys of FORECAST_FIELDS; default all).
+        """
+        if columns is None:
+            columns = FORECAST_FIELDS.keys()
+        n = min(forecast_hours, len(hourly['time']))
+
+        time = np.array(hourly['time'][:n], dtype='datetime64[m]')
+        data = {}
+        for name in columns:
+            if name not in FORECAST_FIELDS:
+                raise ValueError(f"Unknown forecast column: {name}")
+            data[name] = np.array(hourly[FORECAST_FIELDS[name]][:n], dtype=np.float64)
+        return cls(time, data)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __sizeof__(self):
+        """
+        Bytes held by the arrays plus the `records()` list, counted whether
+        or not it has been built yet, so a cache can bound memory when the
+        forecast is stored.
+        """
+        size = object.__sizeof__(self) + self.time.nbytes + sum(column.nbytes for column in self.columns.values())
+        n = len(self.time)
+        if n:
+            row = {'time': None, **{name: None for name in self.columns}}
+            per_row = sys.getsizeof(row) + sys.getsizeof(datetime(2000, 1, 1)) + len(self.columns) * sys.getsizeof(0.0)
+            size += sys.getsizeof([None] * n) + n * per_row
+        return size
+
+    def __getitem__(self, name):
+        if name == 'time':
+            return self.time
+        return self.columns[name]
+
+    def select(self, columns):
+        """A view holding only `columns`; arrays are shared, not copied."""
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise ValueError(f"Unknown forecast column(s): {', '.join(missing)}")
+        return ForecastColumns(self.time, {name: self.columns[name] for name in columns})
+
+    def records(self):
+        """List of per-hour dicts ({'time': datetime, 'temp': ..., ...}); NaN becomes None."""
+        if self._records is None:
+            times = self.time.tolist()
+            values = {
+                name: [None if v != v else v for v in column.tolist()]
+                for name, column in self.columns.items()
+            }
+            self._records = [
+                {'time': t, **{name: column[i] for name, column in values.items()}}
+                for i, t in enumerate(times)
+            ]
+        return self._records
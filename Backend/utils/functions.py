@@ -5,6 +5,8 @@ import pandas as pd
 import os
 from datetime import datetime, timedelta
 import gzip 
+from utils.granule_reader import subset_bbox
+from utils.granule_index import search_data
 
 def login():
     auth = earthaccess.login(strategy="netrc")
@@ -32,18 +34,23 @@ def get_opendap_url(granule):
             return url_info["URL"]
     return None  # if no OPeNDAP found
 
+def find_opendap_urls(short_name, version, temporal, bounding_box): 
+    """OPeNDAP URLs of the matching granules; the search is answered from the local granule index where it can be"""
+    return [get_opendap_url(granule) for granule in search_data(short_name, version, temporal, bounding_box)]
 
 
-def get_no2(dataset: str): 
+
+def get_no2(dataset: str, bbox=None): 
 
     if dataset[-3:] != ".nc":
         raise ValueError(f".nc file expected. Instead got filetype: {dataset[dataset.find(".") + 1:]}\n")
-    # Load the file
+    # open_dataset is lazy: only the subset that is used gets read
     #ds = xr.open_dataset(dataset)
     ds = xr.open_dataset(dataset, engine="netcdf4")
 
-    # Access the tropospheric NO2 column
+    # Access the tropospheric NO2 column, limited to bbox (min_lon, min_lat, max_lon, max_lat)
     no2 = ds['NO2_VERTICAL_CO']
-    print(no2[:10])
-
-
+    if bbox is not None: 
+        no2 = subset_bbox(no2, bbox)
+    print(no2[:10].values)
+    return no2
@@ -0,0 +1,121 @@
+import netCDF4 as nc
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from utils.pixel_locator import GEO_FILL
+
+# Swath granule outlines and a spatial index over them, so points can be
+# matched to the granules that cover them from geolocation alone, before any
+# product array is read - or from the outline in a granule's search result,
+# before it is even downloaded.
+
+
+def footprint(lat, lon, fill_value=GEO_FILL):
+    """
+    Outline of a granule as an (n, 2) array of (lon, lat), counter-clockwise:
+    the first and last scanlines with valid pixels, joined by the first and
+    last valid pixel of every scanline in between. Empty if no pixel is valid.
+    """
+    lat = np.ma.filled(np.ma.asarray(lat, dtype=np.float64), fill_value)
+    lon = np.ma.filled(np.ma.asarray(lon, dtype=np.float64), fill_value)
+    mask = (lon != fill_value) & (lat != fill_value) & np.isfinite(lon) & np.isfinite(lat)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return np.empty([0, 2])
+
+    first_row, last_row = rows[0], rows[-1]
+    first_edge = np.stack((lon[first_row, mask[first_row]], lat[first_row, mask[first_row]])).T
+    last_edge = np.stack((lon[last_row, mask[last_row]], lat[last_row, mask[last_row]])).T
+
+    # First and last valid pixel of each scanline in between
+    middle = rows[(rows > first_row) & (rows < last_row)]
+    ny = mask.shape[1]
+    lo = mask[middle].argmax(axis=1)
+    hi = ny - 1 - mask[middle, ::-1].argmax(axis=1)
+    top = np.stack((lon[middle, lo], lat[middle, lo])).T
+    bottom = np.stack((lon[middle, hi], lat[middle, hi])).T
+
+    return np.concatenate([first_edge[::-1], top, last_edge, bottom[::-1]])
+
+
+def umm_footprint(result):
+    """
+    Outline of a granule from the GPolygons of its search result (UMM
+    spatial extent) as a shapely geometry, or None if it has none.
+    """
+    geometry = result["umm"].get("SpatialExtent", {}).get("HorizontalSpatialDomain", {}).get("Geometry", {})
+    polygons = []
+    for polygon in geometry.get("GPolygons", []):
+        points = polygon["Boundary"]["Points"]
+        if len(points) >= 3:
+            polygons.append(Polygon([(point["Longitude"], point["Latitude"]) for point in points]))
+    if not polygons:
+        return None
+    return shapely.make_valid(shapely.union_all(polygons))
+
+
+def read_geolocation(filename):
+    """Latitude and longitude of a TEMPO L2 granule, without reading any product variable."""
+    with nc.Dataset(filename) as ds:
+        geo = ds.groups["geolocation"]
+        return geo.variables["latitude"][:], geo.variables["longitude"][:]
+
+
+class FootprintIndex:
+    """
+    STRtree over granule footprints. Add granules by name, then match a
+    batch of points to the granules containing them in one query.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.polygons = []
+        self._tree = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, lat, lon, fill_value=GEO_FILL):
+        """Index a granule by its geolocation arrays. Returns False if it has no valid outline."""
+        outline = footprint(lat, lon, fill_value)
+        if len(outline) < 3:
+            return False
+        return self.add_polygon(name, Polygon(outline))
+
+    def add_polygon(self, name, polygon):
+        """Index a granule by an outline already at hand (e.g. umm_footprint)."""
+        if not polygon.is_valid:
+            polygon = shapely.make_valid(polygon)
+        self.names.append(name)
+        self.polygons.append(polygon)
+        self._tree = None
+        return True
+
+    def add_file(self, filename, name=None):
+        """Index a granule file, reading only its geolocation."""
+        lat, lon = read_geolocation(filename)
+        return self.add(filename if name is None else name, lat, lon)
+
+    def _query(self, lons, lats):
+        if self._tree is None:
+            self._tree = shapely.STRtree(self.polygons)
+        points = shapely.points(np.atleast_1d(lons), np.atleast_1d(lats))
+        return self._tree.query(points, predicate="within")
+
+    def match(self, lons, lats):
+        """For each point, the names of the granules containing it, in insertion order."""
+        n = len(np.atleast_1d(lons))
+        matches = [[] for _ in range(n)]
+        if not self.names:
+            return matches
+        point_idx, granule_idx = self._query(lons, lats)
+        for i, j in sorted(zip(point_idx, granule_idx)):
+            matches[i].append(self.names[j])
+        return matches
+
+    def granules(self, lons, lats):
+        """Names of the granules containing at least one of the points, in insertion order."""
+        if not self.names:
+            return []
+        _, granule_idx = self._query(lons, lats)
+        return [self.names[j] for j in np.unique(granule_idx)]
@@ -0,0 +1,260 @@
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import sqlite3
+import threading
+import time
+import earthaccess
+from earthaccess.results import DataGranule
+
+# Local index of earthaccess (CMR) granule search results, kept in SQLite:
+#   granules        one row per granule: collection, time range, search result JSON
+#   granule_bounds  R-tree over each granule's lon/lat bounds
+#   coverage        (collection, time range, bbox) windows already searched
+# A search is answered from the index for the part of its (time, bbox) window
+# that is covered; only the uncovered remainder is sent to CMR. Windows close
+# to now are never marked covered, since new granules still arrive for them.
+
+INDEX_PATH = "granule_index.sqlite"
+SETTLE = 6 * 60 * 60  # seconds; newer parts of a window are always re-searched
+MAX_UPSTREAM = 4  # uncovered pieces searched separately; more are merged into one search
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS granules (
+    id INTEGER PRIMARY KEY,
+    granule_id TEXT UNIQUE NOT NULL,
+    short_name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    begin REAL NOT NULL,
+    end REAL NOT NULL,
+    cloud_hosted INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS granules_time ON granules (short_name, version, begin, end);
+CREATE VIRTUAL TABLE IF NOT EXISTS granule_bounds USING rtree (id, min_lon, max_lon, min_lat, max_lat);
+CREATE TABLE IF NOT EXISTS coverage (
+    id INTEGER PRIMARY KEY,
+    short_name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    begin REAL NOT NULL,
+    end REAL NOT NULL,
+    min_lon REAL NOT NULL,
+    min_lat REAL NOT NULL,
+    max_lon REAL NOT NULL,
+    max_lat REAL NOT NULL,
+    searched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_time ON coverage (short_name, version, begin, end);
+"""
+
+
+def _epoch(value, end=False):
+    """Seconds since the epoch of a datetime or ISO string (UTC if naive). A bare date as `end` means the end of that day."""
+    if isinstance(value, str):
+        date_only = len(value.strip()) == 10
+        value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if date_only and end:
+            value += timedelta(days=1) - timedelta(microseconds=1)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def granule_time(result):
+    """(begin, end) epoch seconds of a search result."""
+    extent = result["umm"]["TemporalExtent"]
+    if "RangeDateTime" in extent:
+        rng = extent["RangeDateTime"]
+        begin = _epoch(rng["BeginningDateTime"])
+        return begin, _epoch(rng.get("EndingDateTime", rng["BeginningDateTime"]))
+    begin = _epoch(extent["SingleDateTime"])
+    return begin, begin
+
+
+def granule_bounds(result):
+    """(min_lon, min_lat, max_lon, max_lat) of a search result's spatial extent; the world if it has none."""
+    geometry = result["umm"].get("SpatialExtent", {}).get("HorizontalSpatialDomain", {}).get("Geometry", {})
+    lons, lats = [], []
+    for rect in geometry.get("BoundingRectangles", []):
+        lons += [rect["WestBoundingCoordinate"], rect["EastBoundingCoordinate"]]
+        lats += [rect["SouthBoundingCoordinate"], rect["NorthBoundingCoordinate"]]
+    for polygon in geometry.get("GPolygons", []):
+        for point in polygon["Boundary"]["Points"]:
+            lons.append(point["Longitude"])
+            lats.append(point["Latitude"])
+    if not lons:
+        return WORLD
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _subtract(box, cut):
+    """
+    Parts of `box` outside `cut`, both (begin, end, min_lon, min_lat,
+    max_lon, max_lat). At most six boxes, split along time, then lon, then lat.
+    """
+    b0, b1, x0, y0, x1, y1 = box
+    c0, c1, cx0, cy0, cx1, cy1 = cut
+    if c0 >= b1 or c1 <= b0 or cx0 >= x1 or cx1 <= x0 or cy0 >= y1 or cy1 <= y0:
+        return [box]
+    pieces = []
+    if b0 < c0:
+        pieces.append((b0, c0, x0, y0, x1, y1))
+    if c1 < b1:
+        pieces.append((c1, b1, x0, y0, x1, y1))
+    t0, t1 = max(b0, c0), min(b1, c1)
+    if x0 < cx0:
+        pieces.append((t0, t1, x0, y0, cx0, y1))
+    if cx1 < x1:
+        pieces.append((t0, t1, cx1, y0, x1, y1))
+    u0, u1 = max(x0, cx0), min(x1, cx1)
+    if y0 < cy0:
+        pieces.append((t0, t1, u0, y0, u1, cy0))
+    if cy1 < y1:
+        pieces.append((t0, t1, u0, cy1, u1, y1))
+    return pieces
+
+
+def _enclosing(boxes):
+    return (min(b[0] for b in boxes), max(b[1] for b in boxes), min(b[2] for b in boxes),
+            min(b[3] for b in boxes), max(b[4] for b in boxes), max(b[5] for b in boxes))
+
+
+class GranuleIndex:
+    """
+    Persistent cache of granule searches. `search` takes the same
+    short_name/version/temporal/bounding_box arguments as
+    earthaccess.search_data and returns DataGranules.
+    """
+
+    def __init__(self, path=INDEX_PATH, search=None):
+        """
+        search : callable, optional
+            Upstream search with earthaccess.search_data's keywords
+            (default earthaccess.search_data).
+        """
+        self.path = path
+        self.upstream = earthaccess.search_data if search is None else search
+        self.upstream_calls = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()  # one writer per process; SQLite serializes processes
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def add(self, short_name, version, results):
+        """Store search results. Returns how many granules were new."""
+        rows = []
+        for result in results:
+            begin, end = granule_time(result)
+            granule_id = result["meta"]["concept-id"] if "meta" in result else result["umm"]["GranuleUR"]
+            rows.append((granule_id, begin, end, granule_bounds(result), json.dumps(dict(result)),
+                         int(getattr(result, "cloud_hosted", False))))
+
+        added = 0
+        with self._lock, self._connect() as db:
+            for granule_id, begin, end, (x0, y0, x1, y1), raw, cloud_hosted in rows:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO granules (granule_id, short_name, version, begin, end, cloud_hosted, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (granule_id, short_name, version, begin, end, cloud_hosted, raw),
+                )
+                if cursor.rowcount:
+                    db.execute("INSERT INTO granule_bounds VALUES (?, ?, ?, ?, ?)", (cursor.lastrowid, x0, x1, y0, y1))
+                    added += 1
+        return added
+
+    def _mark_covered(self, short_name, version, box, searched_at):
+        begin, end = box[0], min(box[1], searched_at - SETTLE)
+        if end <= begin:
+            return
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO coverage (short_name, version, begin, end, min_lon, min_lat, max_lon, max_lat, searched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (short_name, version, begin, end, *box[2:], searched_at),
+            )
+
+    def uncovered(self, short_name, version, begin, end, bbox):
+        """Parts of the (time, bbox) window not searched before, as (begin, end, *bbox) boxes."""
+        remaining = [(begin, end, *bbox)]
+        cuts = self._connect().execute(
+            "SELECT begin, end, min_lon, min_lat, max_lon, max_lat FROM coverage "
+            "WHERE short_name = ? AND version = ? AND begin < ? AND end > ? "
+            "AND min_lon < ? AND max_lon > ? AND min_lat < ? AND max_lat > ?",
+            (short_name, version, end, begin, bbox[2], bbox[0], bbox[3], bbox[1]),
+        ).fetchall()
+        for cut in cuts:
+            remaining = [piece for box in remaining for piece in _subtract(box, cut)]
+            if not remaining:
+                break
+        return remaining
+
+    def local(self, short_name, version, begin, end, bbox, count=None):
+        """Indexed granules overlapping the window, in time order."""
+        query = (
+            "SELECT g.result, g.cloud_hosted FROM granules g JOIN granule_bounds b ON b.id = g.id "
+            "WHERE g.short_name = ? AND g.version = ? AND g.begin <= ? AND g.end >= ? "
+            "AND b.min_lon <= ? AND b.max_lon >= ? AND b.min_lat <= ? AND b.max_lat >= ? "
+            "ORDER BY g.begin"
+        )
+        params = [short_name, version, end, begin, bbox[2], bbox[0], bbox[3], bbox[1]]
+        if count is not None:
+            query += " LIMIT ?"
+            params.append(count)
+        rows = self._connect().execute(query, params).fetchall()
+        return [DataGranule(json.loads(raw), cloud_hosted=bool(cloud_hosted)) for raw, cloud_hosted in rows]
+
+    def search(self, short_name, version, temporal, bounding_box=WORLD, count=None):
+        """
+        Granules of short_name/version in `temporal` (begin, end: datetimes
+        or ISO strings) overlapping `bounding_box`. Searches CMR only for the
+        uncovered part of the window. `count` limits what is returned (the
+        earliest granules), not the upstream search, so the window is still
+        marked covered and later searches with or without `count` are
+        answered locally.
+        """
+        begin, end = _epoch(temporal[0]), _epoch(temporal[1], end=True)
+        bbox = tuple(float(v) for v in bounding_box)
+
+        missing = self.uncovered(short_name, version, begin, end, bbox)
+        if len(missing) > MAX_UPSTREAM:
+            missing = [_enclosing(missing)]
+        for box in missing:
+            searched_at = time.time()
+            results = self.upstream(short_name=short_name, version=version,
+                                    temporal=(_iso(box[0]), _iso(box[1])), bounding_box=tuple(box[2:]))
+            self.upstream_calls += 1
+            self.add(short_name, version, results)
+            self._mark_covered(short_name, version, box, searched_at)
+
+        return self.local(short_name, version, begin, end, bbox, count)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    """Shared GranuleIndex at INDEX_PATH (under $GRANULE_INDEX if set), created on first use."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = GranuleIndex(os.environ.get("GRANULE_INDEX", INDEX_PATH))
+        return _default_index
+
+
+def search_data(short_name, version, temporal, bounding_box=WORLD, count=None):
+    """earthaccess.search_data through the shared GranuleIndex."""
+    return default_index().search(short_name, version, temporal, bounding_box, count)
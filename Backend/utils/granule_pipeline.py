@@ -0,0 +1,301 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import glob
+import os
+import re
+import shutil
+import threading
+import earthaccess
+from shapely.geometry import Polygon
+from utils.granule_footprint import FootprintIndex, footprint, read_geolocation, umm_footprint
+from utils.granule_index import search_data
+
+# Download-and-process pipeline for granule search results. Downloads run on
+# a small thread pool; each file is handed to a process pool as soon as it
+# lands, and results are yielded in granule time order as they become
+# available. Local files are kept up to a disk budget (oldest evicted first)
+# or deleted once processed.
+#
+# Where granules come from is a "source": EarthaccessSource for
+# earthaccess.search_data results, LocalSource for a directory of .nc files
+# standing in for the remote store (offline runs and testing). Given points,
+# `run` first drops the granules whose footprint (from the source) contains
+# none of them, so those are never downloaded.
+
+DOWNLOAD_WORKERS = 4
+DISK_BUDGET = 2 * 1024 ** 3  # bytes of granules kept in the work directory
+_TIME_IN_NAME = re.compile(r"\d{8}T\d{6}")
+
+
+class EarthaccessSource:
+    """Granules are earthaccess search results, downloaded with earthaccess."""
+
+    def search(self, short_name, version, temporal, bounding_box, count=None):
+        """earthaccess.search_data, answered from the local granule index where possible."""
+        return search_data(short_name, version, temporal, bounding_box, count)
+
+    def filename(self, granule):
+        return granule["umm"]["RelatedUrls"][0]["URL"].split("/")[-1]
+
+    def time(self, granule):
+        return granule["umm"]["TemporalExtent"]["RangeDateTime"]["BeginningDateTime"]
+
+    def footprint(self, granule):
+        """Outline from the search result, or None."""
+        return umm_footprint(granule)
+
+    def fetch(self, granule, directory):
+        return earthaccess.download([granule], local_path=directory, threads=1)[0]
+
+
+class LocalSource:
+    """Granules are file names in `directory`; fetching copies them into the work directory."""
+
+    def __init__(self, directory, pattern="*.nc"):
+        self.directory = directory
+        self.pattern = pattern
+
+    def granules(self):
+        """Every matching file, like a search that returns the whole store."""
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.directory, self.pattern)))
+
+    def filename(self, granule):
+        return granule
+
+    def time(self, granule):
+        # TEMPO names carry the scan start, e.g. ..._20230805T130023Z_S001G01.nc
+        match = _TIME_IN_NAME.search(granule)
+        return match.group(0) if match else granule
+
+    def footprint(self, granule):
+        """Outline from the file's geolocation, or None if it has no valid pixels."""
+        outline = footprint(*read_geolocation(os.path.join(self.directory, granule)))
+        return Polygon(outline) if len(outline) >= 3 else None
+
+    def fetch(self, granule, directory):
+        path = os.path.join(directory, granule)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(os.path.join(self.directory, granule), tmp)
+        os.replace(tmp, path)
+        return path
+
+
+class _DiskBudget:
+    """
+    Bytes of granule files in the work directory. Files being processed are
+    pinned; processed files are retained, oldest evicted first, while the
+    total is over budget. Downloads in flight count at the average file size
+    seen so far, so the budget is approximate.
+    """
+
+    def __init__(self, budget, retain):
+        self.budget = budget
+        self.retain = retain
+        self.closed = False
+        self._retained = OrderedDict()  # path -> size, oldest first
+        self._pinned = {}  # path -> size
+        self._inflight = 0
+        self._seen = []
+        self._cond = threading.Condition()
+
+    def _usage(self):
+        average = sum(self._seen) / len(self._seen) if self._seen else 0
+        return sum(self._retained.values()) + sum(self._pinned.values()) + self._inflight * average
+
+    def _evict_one(self):
+        path, _ = self._retained.popitem(last=False)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def reserve(self):
+        """Wait until there is room for one more download."""
+        with self._cond:
+            while not self.closed and self._usage() >= self.budget:
+                if self._retained:
+                    self._evict_one()
+                elif self._pinned:
+                    self._cond.wait()
+                else:
+                    break
+            self._inflight += 1
+
+    def adopt(self, directory):
+        """Count files already in `directory` as retained, oldest first."""
+        paths = [os.path.abspath(os.path.join(directory, name)) for name in os.listdir(directory)]
+        paths = sorted((path for path in paths if os.path.isfile(path)), key=os.path.getmtime)
+        with self._cond:
+            for path in paths:
+                if path not in self._pinned:
+                    self._retained[path] = os.path.getsize(path)
+
+    def cached(self, path):
+        """Pin a retained (or pre-existing) file instead of downloading it. False if it isn't there."""
+        with self._cond:
+            if path in self._pinned:
+                return True
+            if path in self._retained:
+                self._pinned[path] = self._retained.pop(path)
+                return True
+            if os.path.exists(path):
+                self._pinned[path] = os.path.getsize(path)
+                return True
+            return False
+
+    def downloaded(self, path):
+        with self._cond:
+            self._inflight -= 1
+            if path is not None:
+                size = os.path.getsize(path)
+                self._pinned[path] = size
+                self._seen.append(size)
+            self._cond.notify_all()
+
+    def release(self, path):
+        with self._cond:
+            size = self._pinned.pop(path, None)
+            if size is not None:
+                if self.retain:
+                    self._retained[path] = size
+                else:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            while self._retained and self._usage() > self.budget:
+                self._evict_one()
+            self._cond.notify_all()
+
+    def open(self):
+        with self._cond:
+            self.closed = False
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class GranulePipeline:
+    """
+    Overlaps granule downloads with processing.
+
+    `run(granules, process)` yields (granule, process(local_path)) in time
+    order; `process` runs in a worker process, so it must be picklable (a
+    module-level function or a functools.partial of one). A granule whose
+    download or processing fails yields None. With `lons`/`lats`, only
+    granules whose footprint contains at least one of the points are run.
+    """
+
+    def __init__(self, source, workdir, download_workers=DOWNLOAD_WORKERS, process_workers=None,
+                 disk_budget=DISK_BUDGET, retain=True):
+        """
+        Parameters:
+        -----------
+        source : EarthaccessSource or LocalSource
+            Where granules are fetched from.
+        workdir : str
+            Where downloaded granules are kept; use a directory of its own,
+            since files already there count against the budget (and may be
+            evicted) and are used instead of downloading again.
+        process_workers : int, optional
+            Size of the process pool (default: number of CPUs).
+        disk_budget : int
+            Bytes of granules kept in workdir.
+        retain : bool
+            Keep processed files (within the budget) for later runs;
+            otherwise delete each as soon as it is processed.
+        """
+        self.source = source
+        self.workdir = workdir
+        self.download_workers = download_workers
+        self.process_workers = process_workers
+        self.disk_budget = disk_budget
+        self.retain = retain
+        os.makedirs(workdir, exist_ok=True)
+        self._budget = _DiskBudget(disk_budget, retain)
+        self._budget.adopt(workdir)
+
+    def _fetch(self, budget, granule):
+        path = os.path.abspath(os.path.join(self.workdir, self.source.filename(granule)))
+        if budget.cached(path):
+            return path
+        budget.reserve()
+        path = None
+        try:
+            path = os.path.abspath(self.source.fetch(granule, self.workdir))
+        finally:
+            budget.downloaded(path)
+        return path
+
+    def _start(self, budget, pool, process, granule, out):
+        """Download one granule and queue it for processing; runs on a download thread."""
+        if budget.closed:
+            out.cancel()
+            return
+        try:
+            path = self._fetch(budget, granule)
+        except Exception as e:
+            out.set_exception(e)
+            return
+        try:
+            future = pool.submit(process, path)
+        except Exception as e:  # pool already shut down
+            budget.release(path)
+            out.set_exception(e)
+            return
+        future.add_done_callback(partial(self._finish, budget, path, out))
+
+    @staticmethod
+    def _finish(budget, path, out, future):
+        budget.release(path)
+        if future.cancelled():
+            out.cancel()
+        elif future.exception() is not None:
+            out.set_exception(future.exception())
+        else:
+            out.set_result(future.result())
+
+    def prune(self, granules, lons, lats):
+        """
+        The granules whose footprint contains at least one of the points,
+        matched in one STRtree query. Granules without a footprint are kept.
+        """
+        index = FootprintIndex()
+        keep = set()
+        for i, granule in enumerate(granules):
+            outline = self.source.footprint(granule)
+            if outline is None or outline.is_empty:
+                keep.add(i)
+            else:
+                index.add_polygon(i, outline)
+        keep.update(index.granules(lons, lats))
+        return [granule for i, granule in enumerate(granules) if i in keep]
+
+    def run(self, granules, process, lons=None, lats=None):
+        if lons is not None:
+            granules = self.prune(granules, lons, lats)
+        granules = sorted(granules, key=self.source.time)
+        budget = self._budget
+        budget.open()
+        results = [Future() for _ in granules]
+
+        downloads = ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="granule-download")
+        pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        try:
+            for granule, out in zip(granules, results):
+                downloads.submit(self._start, budget, pool, process, granule, out)
+
+            for granule, out in zip(granules, results):
+                try:
+                    result = out.result()
+                except Exception as e:
+                    print(f"Granule {self.source.filename(granule)} failed: {e}")
+                    result = None
+                yield granule, result
+        finally:
+            budget.close()
+            downloads.shutdown(wait=True, cancel_futures=True)
+            pool.shutdown(wait=True, cancel_futures=True)
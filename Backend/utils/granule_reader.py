@@ -0,0 +1,196 @@
+import netCDF4 as nc
+import numpy as np
+import xarray as xr
+from utils.pixel_locator import GEO_FILL, PixelLocator
+
+# Bbox-subset reads of swath (L2) granules. The row/column window covering a
+# bbox is found from the geolocation arrays, read a strip of scanlines at a
+# time, and only that hyperslab of each product variable is read. Peak memory
+# per granule then scales with the bbox rather than the swath.
+
+GEO_GROUP = "geolocation"
+STRIP_ROWS = 256  # scanlines of geolocation read at once while searching for the window
+PAD = 1  # pixels kept around the window so interpolation at its edge has neighbours
+POINT_MARGIN = 0.1  # degrees read around the points in extract_points
+
+
+def _window_bounds(lat, lon, bbox, fill_value=GEO_FILL):
+    """(first row, last row, first col, last col) of valid pixels inside bbox in 2-D arrays, or None."""
+    lat = np.ma.filled(np.ma.asarray(lat, dtype=np.float64), fill_value)
+    lon = np.ma.filled(np.ma.asarray(lon, dtype=np.float64), fill_value)
+    inside = (lat != fill_value) & (lon != fill_value) \
+             & (lon >= bbox[0]) & (lon <= bbox[2]) & (lat >= bbox[1]) & (lat <= bbox[3])
+    rows = np.flatnonzero(inside.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(inside.any(axis=0))
+    return int(rows[0]), int(rows[-1]), int(cols[0]), int(cols[-1])
+
+
+def find_window(lat_var, lon_var, bbox, fill_value=GEO_FILL, strip_rows=STRIP_ROWS, pad=PAD):
+    """
+    (row slice, col slice) of the pixels inside `bbox` (min_lon, min_lat,
+    max_lon, max_lat), padded by `pad` pixels, or None if no pixel is inside.
+    `lat_var`/`lon_var` are 2-D netCDF4 variables (or arrays); they are read
+    `strip_rows` scanlines at a time.
+    """
+    nx, ny = lat_var.shape
+    bounds = None
+    for start in range(0, nx, strip_rows):
+        stop = min(start + strip_rows, nx)
+        strip = _window_bounds(lat_var[start:stop], lon_var[start:stop], bbox, fill_value)
+        if strip is None:
+            continue
+        r0, r1, c0, c1 = strip
+        r0, r1 = r0 + start, r1 + start
+        if bounds is None:
+            bounds = (r0, r1, c0, c1)
+        else:
+            bounds = (bounds[0], r1, min(bounds[2], c0), max(bounds[3], c1))
+    if bounds is None:
+        return None
+    r0, r1, c0, c1 = bounds
+    return slice(max(r0 - pad, 0), min(r1 + pad + 1, nx)), slice(max(c0 - pad, 0), min(c1 + pad + 1, ny))
+
+
+def subset_bbox(da, bbox, fill_value=GEO_FILL):
+    """
+    `da` limited to bbox, without loading it. Works with 1-D latitude and
+    longitude coordinates (gridded products) or 2-D ones (swaths).
+    """
+    lat = next((da.coords[name] for name in ("latitude", "lat") if name in da.coords), None)
+    lon = next((da.coords[name] for name in ("longitude", "lon") if name in da.coords), None)
+    if lat is None or lon is None:
+        raise ValueError(f"{da.name} has no latitude/longitude coordinates")
+
+    if lat.ndim == 1 and lon.ndim == 1:
+        lat_values, lon_values = lat.values, lon.values
+        return da.isel({
+            lat.dims[0]: np.flatnonzero((lat_values >= bbox[1]) & (lat_values <= bbox[3])),
+            lon.dims[0]: np.flatnonzero((lon_values >= bbox[0]) & (lon_values <= bbox[2])),
+        })
+
+    window = find_window(lat, lon, bbox, fill_value)
+    if window is None:
+        window = (slice(0, 0), slice(0, 0))
+    return da.isel({lat.dims[0]: window[0], lat.dims[1]: window[1]})
+
+
+def _split(path):
+    """"group/variable" -> (group, variable); a bare name is in the root group."""
+    group, _, name = path.rpartition("/")
+    return group or None, name
+
+
+def read_granule(filename, variables, bbox=None, geo_group=GEO_GROUP, fill_value=GEO_FILL):
+    """
+    Read `variables` ({name: "group/variable"}) of one granule, limited to
+    the window covering `bbox` (the whole swath if bbox is None).
+
+    Returns:
+    --------
+    (arrays, fill_values), or (None, None) if no pixel is inside bbox.
+    arrays holds each variable plus lat, lon and time (per scanline) of the
+    window, `time_start` (first scanline of the granule) and `window`
+    (row slice, col slice). fill_values holds each variable's _FillValue
+    (where it has one) and "geo".
+    """
+    with nc.Dataset(filename) as ds:
+        geo = ds.groups[geo_group]
+        lat_var, lon_var = geo.variables["latitude"], geo.variables["longitude"]
+        if bbox is None:
+            window = (slice(0, lat_var.shape[0]), slice(0, lat_var.shape[1]))
+        else:
+            window = find_window(lat_var, lon_var, bbox, fill_value)
+            if window is None:
+                return None, None
+        rows, cols = window
+
+        arrays = {
+            "lat": lat_var[rows, cols],
+            "lon": lon_var[rows, cols],
+            "time": geo.variables["time"][rows],
+            "time_start": geo.variables["time"][0],
+            "window": window,
+        }
+        fill_values = {"geo": fill_value}
+        for name, path in variables.items():
+            group, var_name = _split(path)
+            var = (ds.groups[group] if group else ds).variables[var_name]
+            arrays[name] = var[rows, cols]
+            if "_FillValue" in var.ncattrs():
+                fill_values[name] = var.getncattr("_FillValue")
+
+    return arrays, fill_values
+
+
+def extract_points(filename, variables, lons, lats, margin=POINT_MARGIN):
+    """
+    `variables` ({name: "group/variable"}) of one granule interpolated at
+    the points (see PixelLocator.interpolate), reading only the window within
+    `margin` degrees of them. Module-level so it can run in a process pool.
+
+    Returns:
+    --------
+    dict with each variable (NaN where missing), `time` (of the nearest
+    scanline, NaN off-granule) and `time_start`, or None if the granule
+    doesn't cover any of the points.
+    """
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    bbox = (lons.min() - margin, lats.min() - margin, lons.max() + margin, lats.max() + margin)
+    arrays, fill_values = read_granule(filename, variables, bbox)
+    if arrays is None:
+        return None
+
+    locator = PixelLocator(arrays["lat"], arrays["lon"], fill_values["geo"])
+    rows, _ = locator.nearest(lons, lats)
+    if (rows < 0).all():
+        return None
+
+    time = np.ma.filled(np.ma.asarray(arrays["time"], dtype=np.float64), np.nan)
+    out = {
+        "time": np.where(rows >= 0, time[np.maximum(rows, 0)], np.nan),
+        "time_start": float(arrays["time_start"]),
+    }
+    for name in variables:
+        out[name] = locator.interpolate(arrays[name], lons, lats, value_fill=fill_values.get(name))
+    return out
+
+
+def open_stack(filenames, variables, bbox, geo_group=GEO_GROUP, fill_value=GEO_FILL, chunks=None):
+    """
+    Lazy (dask-backed) stack of the bbox windows of many granules.
+
+    Each granule's window is flattened to a `pixel` dimension and the
+    granules are concatenated along it, with `granule` (index into
+    filenames), lat, lon and time as coordinates. Nothing is read until the
+    result is computed, and then only the windows. Granules that don't
+    cover bbox are left out. Needs dask installed (xarray's `chunks`).
+    """
+    chunks = {} if chunks is None else chunks
+    pieces = []
+    for i, filename in enumerate(filenames):
+        with nc.Dataset(filename) as ds:
+            geo = ds.groups[geo_group]
+            window = find_window(geo.variables["latitude"], geo.variables["longitude"], bbox, fill_value)
+        if window is None:
+            continue
+
+        geo = xr.open_dataset(filename, group=geo_group, chunks=chunks)
+        row_dim, col_dim = geo["latitude"].dims
+        index = {row_dim: window[0], col_dim: window[1]}
+        lat, lon, time = xr.broadcast(geo["latitude"].isel(index), geo["longitude"].isel(index), geo["time"].isel({row_dim: window[0]}))
+
+        data = {}
+        for name, path in variables.items():
+            group, var_name = _split(path)
+            data[name] = xr.open_dataset(filename, group=group, chunks=chunks)[var_name].isel(index)
+
+        piece = xr.Dataset(data, coords={"lat": lat, "lon": lon, "time": time})
+        piece = piece.stack(pixel=(row_dim, col_dim)).reset_index("pixel", drop=True)
+        pieces.append(piece.assign_coords(granule=("pixel", np.full(piece.sizes["pixel"], i))))
+
+    if not pieces:
+        return xr.Dataset()
+    return xr.concat(pieces, dim="pixel")
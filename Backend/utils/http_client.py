@@ -0,0 +1,80 @@
+from urllib.parse import urlsplit
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared upstream HTTP client. One pooled, keep-alive session per upstream host
+# so repeated Open-Meteo calls reuse TCP+TLS connections instead of
+# re-handshaking on every request.
+
+POOL_SIZE = 16         # connections kept alive per host
+CONNECT_TIMEOUT = 3.05  # seconds
+READ_TIMEOUT = 15       # seconds
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def configure(pool_size=None, connect_timeout=None, read_timeout=None):
+    """
+    Change pool size and default timeouts. Existing sessions are dropped so
+    the new pool size applies to the next request.
+    """
+    global POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT
+
+    with _lock:
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            READ_TIMEOUT = read_timeout
+
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_session(url):
+    """Return the pooled session for the host of `url`, creating it on first use."""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount(host, adapter)
+            session.headers["Connection"] = "keep-alive"
+            _sessions[host] = session
+    return session
+
+
+def get(url, params=None, timeout=None):
+    """
+    GET `url` through the pooled session for its host.
+
+    Parameters:
+    -----------
+    url : str
+    params : dict, optional
+        Query parameters, passed through to requests.
+    timeout : float or (connect, read) tuple, optional
+        Defaults to (CONNECT_TIMEOUT, READ_TIMEOUT).
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return get_session(url).get(url, params=params, timeout=timeout)
+
+
+def close_all():
+    """Close every pooled session (e.g. on shutdown)."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import threading
+import time
+import uuid
+
+# Background jobs for queries that outlast a mobile HTTP timeout. A client
+# submits a job, gets its id straight away, and polls (or long-polls) for
+# progress and the result.
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = {}  # step (e.g. product or "date product") -> status
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def report_progress(self, step, status):
+        """Progress callback handed to the job function."""
+        self.progress[step] = status
+
+    def to_dict(self):
+        def iso(t):
+            return None if t is None else datetime.fromtimestamp(t).isoformat(timespec='seconds')
+
+        out = {
+            "job_id": self.id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "submitted_at": iso(self.submitted_at),
+            "finished_at": iso(self.finished_at),
+        }
+        if self.status == DONE:
+            out["result"] = self.result
+        if self.status == FAILED:
+            out["error"] = self.error
+        return out
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool.
+
+    At most `max_queue` jobs may be queued or running; further submissions
+    raise JobQueueFull. Finished jobs are kept for `result_ttl` seconds, and
+    submitting a job identical (same type and params) to a running or
+    recently finished one returns that job instead of starting a new one.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, result_ttl=3600):
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._jobs = {}  # id -> Job
+        self._by_key = {}  # (type, params) -> Job
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                key = (job.kind, json.dumps(job.params, sort_keys=True))
+                if self._by_key.get(key) is job:
+                    del self._by_key[key]
+
+    def submit(self, kind, params, func):
+        """
+        Queue func(report_progress) as a job. Returns (job, created), where
+        created is False if an identical job was reused.
+        """
+        key = (kind, json.dumps(params, sort_keys=True))
+        with self._lock:
+            self._purge()
+            existing = self._by_key.get(key)
+            if existing is not None and existing.status != FAILED:
+                return existing, False
+
+            pending = sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+            if pending >= self.max_queue:
+                raise JobQueueFull(f"Too many jobs in progress ({pending}); try again later")
+
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        self._executor.submit(self._run, job, func)
+        return job, True
+
+    def _run(self, job, func):
+        job.status = RUNNING
+        try:
+            job.result = func(job.report_progress)
+            job.status = DONE
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job.done.set()
+
+    def get(self, job_id, wait=0):
+        """
+        The job with `job_id`, or None if unknown or expired. With wait > 0,
+        blocks up to that many seconds for the job to finish (long-poll).
+        """
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+        if job is not None and wait > 0:
+            job.done.wait(wait)
+        return job
@@ -0,0 +1,178 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Point lookups in swath (L2) granules, whose pixels sit on a curvilinear
+# lat/lon grid. A KD-tree over the valid pixels' unit vectors finds each
+# point's nearest pixel; the point is then placed inside one of the four grid
+# cells around that pixel by inverting the cell's bilinear map, and the
+# product is interpolated from the cell corners. All of it runs over arrays of
+# points at once.
+
+GEO_FILL = 9.969209968386869e36  # TEMPO geolocation fill value
+EARTH_RADIUS_KM = 6371.0
+NEWTON_STEPS = 6
+CELL_TOLERANCE = 1e-6  # slack on the 0..1 cell coordinates
+_QUADS = [(-1, -1), (-1, 0), (0, -1), (0, 0)]  # cell origins relative to the nearest pixel
+
+
+def _unit_vectors(lon, lat):
+    lon = np.radians(lon)
+    lat = np.radians(lat)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _valid(array, fill_value=None):
+    """False where `array` is masked, non-finite or equal to `fill_value`."""
+    data = np.ma.getdata(array).astype(np.float64, copy=False)
+    valid = ~np.ma.getmaskarray(array) & np.isfinite(data)
+    if fill_value is not None:
+        valid &= data != fill_value
+    return data, valid
+
+
+class PixelLocator:
+    """
+    Locates points in one granule's 2-D geolocation arrays.
+
+    Build it once per granule and query it with many points; `values` can
+    be any product array on the same grid.
+    """
+
+    def __init__(self, lat, lon, fill_value=GEO_FILL, max_distance_km=None):
+        """
+        Parameters:
+        -----------
+        lat, lon : 2-D arrays (masked arrays are fine)
+            Pixel-center geolocation.
+        fill_value : float
+            Geolocation fill value; those pixels are left out of the tree.
+        max_distance_km : float, optional
+            Points farther than this from every valid pixel are outside the
+            granule. Defaults to twice the median pixel spacing.
+        """
+        self.lat, lat_ok = _valid(lat, fill_value)
+        self.lon, lon_ok = _valid(lon, fill_value)
+        self.geo_valid = lat_ok & lon_ok & (np.abs(self.lat) <= 90) & (np.abs(self.lon) <= 180)
+        self.shape = self.lat.shape
+
+        self._pixels = np.flatnonzero(self.geo_valid)
+        self._tree = cKDTree(_unit_vectors(self.lon.ravel()[self._pixels], self.lat.ravel()[self._pixels])) if len(self._pixels) else None
+
+        if max_distance_km is None:
+            max_distance_km = 2 * self.pixel_spacing_km()
+        self.max_distance_km = max_distance_km
+
+    def pixel_spacing_km(self, sample=1000):
+        """Median distance between neighbouring valid pixels."""
+        if self._tree is None or len(self._pixels) < 2:
+            return np.inf
+        step = max(1, len(self._pixels) // sample)
+        distances, _ = self._tree.query(self._tree.data[::step], k=2)
+        return float(np.median(distances[:, 1])) * EARTH_RADIUS_KM
+
+    def nearest(self, lons, lats):
+        """
+        (rows, cols) of the nearest valid pixel to each point; -1 for points
+        outside the granule.
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        rows = np.full(lons.shape, -1)
+        cols = np.full(lons.shape, -1)
+        if self._tree is None:
+            return rows, cols
+
+        # Chord length of the max distance on the unit sphere
+        bound = 2 * np.sin(min(self.max_distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+        _, index = self._tree.query(_unit_vectors(lons, lats), distance_upper_bound=bound)
+        hit = index < len(self._pixels)
+        rows[hit], cols[hit] = np.unravel_index(self._pixels[index[hit]], self.shape)
+        return rows, cols
+
+    def _cell_coords(self, rows, cols, lons, lats):
+        """
+        For each point, the origin (row, col) of the grid cell containing it
+        and its (s, t) position in that cell, or -1 origins if none of the
+        four cells around the nearest pixel contains it.
+        """
+        nx, ny = self.shape
+        origin_r = np.full(rows.shape, -1)
+        origin_c = np.full(rows.shape, -1)
+        s_out = np.zeros(rows.shape)
+        t_out = np.zeros(rows.shape)
+        scale = np.cos(np.radians(lats))
+
+        for dr, dc in _QUADS:
+            r0 = rows + dr
+            c0 = cols + dc
+            todo = (origin_r < 0) & (rows >= 0) & (r0 >= 0) & (r0 + 1 < nx) & (c0 >= 0) & (c0 + 1 < ny)
+            if not todo.any():
+                continue
+            r0, c0 = r0[todo], c0[todo]
+            corners = [(r0, c0), (r0 + 1, c0), (r0, c0 + 1), (r0 + 1, c0 + 1)]
+            todo_idx = np.flatnonzero(todo)
+            ok = np.logical_and.reduce([self.geo_valid[r, c] for r, c in corners])
+
+            # Corners in a local plane centred on the point (km-ish, dateline-safe)
+            xy = []
+            for r, c in corners:
+                dlon = (self.lon[r, c] - lons[todo] + 180) % 360 - 180
+                xy.append(np.stack([dlon * scale[todo], self.lat[r, c] - lats[todo]]))
+            p00, p10, p01, p11 = xy  # (row, col), (row+1, col), (row, col+1), (row+1, col+1)
+
+            # Newton iterations on P(s, t) = 0 for the bilinear map of the cell
+            s = np.full(len(todo_idx), 0.5)
+            t = np.full(len(todo_idx), 0.5)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for _ in range(NEWTON_STEPS):
+                    p = (1 - s) * (1 - t) * p00 + s * (1 - t) * p10 + (1 - s) * t * p01 + s * t * p11
+                    ps = (1 - t) * (p10 - p00) + t * (p11 - p01)
+                    pt = (1 - s) * (p01 - p00) + s * (p11 - p10)
+                    det = ps[0] * pt[1] - ps[1] * pt[0]
+                    s = s - (pt[1] * p[0] - pt[0] * p[1]) / det
+                    t = t - (ps[0] * p[1] - ps[1] * p[0]) / det
+
+            inside = ok & (s >= -CELL_TOLERANCE) & (s <= 1 + CELL_TOLERANCE) & (t >= -CELL_TOLERANCE) & (t <= 1 + CELL_TOLERANCE)
+            found = todo_idx[inside]
+            origin_r[found] = r0[inside]
+            origin_c[found] = c0[inside]
+            s_out[found] = np.clip(s[inside], 0, 1)
+            t_out[found] = np.clip(t[inside], 0, 1)
+
+        return origin_r, origin_c, s_out, t_out
+
+    def interpolate(self, values, lons, lats, value_fill=None, fill_value=np.nan):
+        """
+        Bilinear interpolation of `values` (same grid as lat/lon) at each point.
+
+        Corners that are masked, non-finite or equal to `value_fill` are
+        dropped and the remaining weights renormalized. Points outside the
+        granule, or whose cell has no valid corner, get `fill_value`. Points
+        near the swath edge with no enclosing cell take the nearest pixel's
+        value.
+        """
+        data, valid = _valid(values, value_fill)
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        out = np.full(lons.shape, fill_value, dtype=np.float64)
+
+        rows, cols = self.nearest(lons, lats)
+        r0, c0, s, t = self._cell_coords(rows, cols, lons, lats)
+
+        in_cell = r0 >= 0
+        if in_cell.any():
+            r, c, s, t = r0[in_cell], c0[in_cell], s[in_cell], t[in_cell]
+            corners = [(r, c), (r + 1, c), (r, c + 1), (r + 1, c + 1)]
+            weights = np.stack([(1 - s) * (1 - t), s * (1 - t), (1 - s) * t, s * t])
+            corner_values = np.stack([np.where(valid[i, j], data[i, j], 0.0) for i, j in corners])
+            weights = weights * np.stack([valid[i, j] for i, j in corners])
+            total = weights.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[in_cell] = np.where(total > 0, (weights * corner_values).sum(axis=0) / total, fill_value)
+
+        edge = ~in_cell & (rows >= 0)
+        if edge.any():
+            r, c = rows[edge], cols[edge]
+            out[edge] = np.where(valid[r, c], data[r, c], fill_value)
+
+        return out
@@ -0,0 +1,317 @@
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+from utils.cache import GRID, RETENTION_DAYS, grid_key
+from utils.rsig_cache import evict_all as evict_raw
+from utils.singleflight import file_lock
+
+# Local, incremental store for RSIG pollutant data. Data is partitioned as
+#   <root>/<product>/<cell>/<YYYY-MM-DD>.parquet
+# where <cell> is the request's grid cell and days are UTC. Each
+# <product>/<cell>/index.json records, per day, how far that day has been
+# fetched and when, so a request only downloads days (or trailing hours of
+# today) that are not stored yet. Observations can arrive hours late, so the
+# last LATE_DATA of what was fetched stays provisional: it is re-fetched
+# (at most every TODAY_REFRESH) until a fetch ran LATE_DATA after it.
+#
+# Partitions are compact Parquet: only time, lon/lat and the numeric value
+# columns are kept, with floats downcast to float32. Reads push the time and
+# bbox predicates down to the Parquet row groups.
+
+STORE_ROOT = "pollutant_store"
+TODAY_REFRESH = 15 * 60  # seconds; minimum gap between re-fetches of provisional hours
+LATE_DATA = 6 * 60 * 60  # seconds; how late observations may still arrive
+EVICT_INTERVAL = 3600  # seconds between retention sweeps
+
+
+def _utc(dt):
+    """Coerce a datetime or ISO string to an aware UTC datetime (naive means UTC)."""
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _day_start(day):
+    return datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def _index_entry(index, day):
+    """(fetched through, fetched at) of an indexed day; older indexes recorded only the first."""
+    entry = index[day]
+    if isinstance(entry, str):
+        return _utc(entry), _utc(entry)
+    return _utc(entry["through"]), _utc(entry["checked"])
+
+
+def _coord_columns(columns):
+    """Names of the longitude and latitude columns (None where absent)."""
+    lon = next((c for c in columns if c.lower() in ('longitude', 'lon')), None)
+    lat = next((c for c in columns if c.lower() in ('latitude', 'lat')), None)
+    return lon, lat
+
+
+def value_column(df, hint=None):
+    """
+    Name of the value column of an RSIG DataFrame: the first float column
+    that isn't a coordinate (or `year`), preferring one whose name contains
+    `hint`. None if there is none.
+    """
+    skip = set(_coord_columns(df.columns)) | {'time', 'year'}
+    values = [c for c in df.columns if c not in skip and pd.api.types.is_float_dtype(df[c])]
+    if hint is not None:
+        named = [c for c in values if hint.lower() in str(c).lower()]
+        if named:
+            return named[0]
+    return values[0] if values else None
+
+
+def compact(df):
+    """
+    Keep only what scoring and trends use - time, lon/lat and numeric value
+    columns - with times as UTC and floats as float32.
+    """
+    keep = {}
+    for name in df.columns:
+        column = df[name]
+        if name == 'time':
+            keep[name] = pd.to_datetime(column, utc=True)
+        elif pd.api.types.is_float_dtype(column):
+            keep[name] = column.astype(np.float32)
+        elif pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            keep[name] = column
+    return pd.DataFrame(keep)
+
+
+class PollutantStore:
+    """
+    Day-partitioned store of pollutant DataFrames per (product, grid cell).
+
+    `get_window` returns the data for a time window, calling `fetch` only for
+    the missing days. `fetch(bbox, bdate, edate)` must return a DataFrame with
+    a `time` column; it is always called with the cell's canonical bbox so
+    every request in the same cell shares the same partitions.
+    """
+
+    def __init__(self, root=STORE_ROOT, grid=GRID, half_width=GRID, retention_days=RETENTION_DAYS):
+        self.root = root
+        self.grid = grid
+        self.half_width = half_width
+        self.retention_days = retention_days
+        self._last_evict = 0
+        self._lock = threading.Lock()
+
+    def cell_bbox(self, cell):
+        """Canonical (min_lon, min_lat, max_lon, max_lat) for a grid cell."""
+        lat = cell[0] * self.grid
+        lon = cell[1] * self.grid
+        return (lon - self.half_width, lat - self.half_width, lon + self.half_width, lat + self.half_width)
+
+    def _cell_dir(self, product, cell):
+        return os.path.join(self.root, product, f"{cell[0]}_{cell[1]}")
+
+    def _load_index(self, cell_dir):
+        try:
+            with open(os.path.join(cell_dir, "index.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, cell_dir, index):
+        path = os.path.join(cell_dir, "index.json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+
+    def _partition_path(self, cell_dir, day):
+        return os.path.join(cell_dir, f"{day}.parquet")
+
+    def _read_partition(self, cell_dir, day):
+        path = self._partition_path(cell_dir, day)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def _write_partition(self, cell_dir, day, df):
+        path = self._partition_path(cell_dir, day)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(pa.Table.from_pandas(compact(df), preserve_index=False), tmp)
+        os.replace(tmp, path)
+
+    def _missing_ranges(self, cell_dir, index, days, edate, now=None):
+        """
+        Contiguous (start, end) UTC datetime ranges that still need fetching.
+        Incomplete days resume from where the last fetch stopped, less the
+        provisional LATE_DATA before it.
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        ranges = []
+        for day in days:
+            day_start = _day_start(day)
+            day_end = min(day_start + timedelta(days=1), edate)
+            if day not in index or not os.path.exists(self._partition_path(cell_dir, day)):
+                start = day_start  # never fetched, or indexed but the file is gone
+            else:
+                fetched_through, checked = _index_entry(index, day)
+                late = timedelta(seconds=LATE_DATA)
+                if fetched_through >= day_end and checked - late >= day_end:
+                    continue  # complete and settled
+                # Don't re-fetch provisional hours more often than TODAY_REFRESH
+                if (now - checked).total_seconds() < TODAY_REFRESH:
+                    continue
+                start = max(day_start, min(fetched_through, checked - late))
+            if start >= day_end:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], day_end)
+            else:
+                ranges.append((start, day_end))
+        return ranges
+
+    def _store_range(self, cell_dir, index, df, start, end, checked):
+        """
+        Split a frame fetched at `checked` into day partitions. Stored rows
+        from `start` on are replaced by the fetched ones. An empty fetch
+        still advances the index, so the range isn't fetched again.
+        """
+        if df is None or df.empty or 'time' not in df:
+            df = pd.DataFrame({'time': pd.Series(dtype='datetime64[ns, UTC]')})
+        times = pd.to_datetime(df['time'], utc=True)
+        df = df.assign(time=times)
+        day = start.strftime("%Y-%m-%d")
+        while _day_start(day) < end:
+            part = df[times.dt.strftime("%Y-%m-%d") == day]
+            existing = self._read_partition(cell_dir, day) if day in index else None
+            if existing is not None and not existing.empty:
+                existing = existing[pd.to_datetime(existing['time'], utc=True) < start]
+                part = pd.concat([existing, part], ignore_index=True)
+            self._write_partition(cell_dir, day, part.reset_index(drop=True))
+            index[day] = {
+                "through": min(_day_start(day) + timedelta(days=1), end).isoformat(),
+                "checked": checked.isoformat(),
+            }
+            day = (_day_start(day) + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def get_window(self, product, bbox, bdate, edate, fetch):
+        """
+        Data for `product` in the grid cell of `bbox` between bdate and edate
+        (datetimes or ISO strings; naive values are taken as UTC).
+        """
+        bdate = _utc(bdate)
+        edate = min(_utc(edate), datetime.now(timezone.utc))
+        cell = grid_key(bbox, self.grid)
+        cell_dir = self._cell_dir(product, cell)
+        os.makedirs(cell_dir, exist_ok=True)
+
+        n_days = (edate.date() - bdate.date()).days + 1
+        days = [(bdate + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_days)]
+
+        # One writer per (product, cell) at a time, across threads and
+        # processes; a waiting request re-reads the index and usually finds
+        # the days it needed already stored
+        with file_lock(os.path.join(cell_dir, ".lock")):
+            index = self._load_index(cell_dir)
+            for start, end in self._missing_ranges(cell_dir, index, days, edate):
+                print(f"Store miss for {product} {cell}: fetching {start.isoformat()} to {end.isoformat()}")
+                checked = datetime.now(timezone.utc)
+                df = fetch(self.cell_bbox(cell), start.isoformat(timespec='seconds'), end.isoformat(timespec='seconds'))
+                self._store_range(cell_dir, index, df, start, end, checked)
+                self._save_index(cell_dir, index)
+
+        self.maybe_evict()
+
+        return self.read_window(cell_dir, days, bdate, edate, bbox)
+
+    def read_stored(self, product, bbox, bdate, edate, columns=None):
+        """Whatever is already stored for the cell of `bbox` between bdate and edate; never fetches."""
+        bdate = _utc(bdate)
+        edate = _utc(edate)
+        cell_dir = self._cell_dir(product, grid_key(bbox, self.grid))
+        n_days = (edate.date() - bdate.date()).days + 1
+        days = [(bdate + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_days)]
+        return self.read_window(cell_dir, days, bdate, edate, bbox, columns)
+
+    def read_window(self, cell_dir, days, bdate, edate, bbox=None, columns=None):
+        """
+        Read `days` of one (product, cell) with the time window (and bbox, if
+        given) pushed down to the Parquet scan. `columns` limits what is read.
+        """
+        paths = [self._partition_path(cell_dir, day) for day in days]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return pd.DataFrame(columns=['time'])
+
+        # A day with no data is stored as a time-only partition; unify the
+        # schemas so the first file doesn't decide which columns exist
+        schema = pa.unify_schemas([pq.read_schema(path).remove_metadata() for path in paths],
+                                  promote_options="permissive")
+        dataset = pads.dataset(paths, schema=schema, format="parquet")
+        names = dataset.schema.names
+        predicate = (pads.field('time') >= pa.scalar(bdate, pa.timestamp('ns', tz='UTC'))) & \
+                    (pads.field('time') <= pa.scalar(edate, pa.timestamp('ns', tz='UTC')))
+        lon, lat = _coord_columns(names)
+        if bbox is not None and lon is not None and lat is not None:
+            predicate = predicate & (pads.field(lon) >= bbox[0]) & (pads.field(lon) <= bbox[2]) \
+                                  & (pads.field(lat) >= bbox[1]) & (pads.field(lat) <= bbox[3])
+        if columns is not None:
+            columns = [name for name in ['time', *columns] if name in names]
+        return dataset.to_table(columns=columns, filter=predicate).to_pandas()
+
+    def maybe_evict(self):
+        """Run `evict` if the last sweep was more than EVICT_INTERVAL ago."""
+        with self._lock:
+            if time.time() - self._last_evict < EVICT_INTERVAL:
+                return 0
+            self._last_evict = time.time()
+        return self.evict()
+
+    def evict(self, now=None):
+        """
+        Delete partitions older than `retention_days`, and raw RSIG downloads
+        unused for as long. Returns how many partitions were removed.
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+
+        evict_raw(self.retention_days * 24 * 60 * 60)
+
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for product in os.listdir(self.root):
+            product_dir = os.path.join(self.root, product)
+            if not os.path.isdir(product_dir):
+                continue
+            for cell in os.listdir(product_dir):
+                cell_dir = os.path.join(product_dir, cell)
+                if not os.path.isdir(cell_dir):
+                    continue
+                # Same lock as the writers in get_window. The directory (and
+                # its lock file) is kept even when emptied, so a writer
+                # waiting on the lock never writes into a removed directory.
+                with file_lock(os.path.join(cell_dir, ".lock")):
+                    index = self._load_index(cell_dir)
+                    old = [day for day in index if day < cutoff]
+                    for day in old:
+                        try:
+                            os.remove(self._partition_path(cell_dir, day))
+                        except FileNotFoundError:
+                            pass
+                        del index[day]
+                        removed += 1
+                    if old:
+                        self._save_index(cell_dir, index)
+        if removed:
+            print(f"Evicted {removed} pollutant partitions older than {cutoff}")
+        return removed
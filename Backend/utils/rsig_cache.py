@@ -0,0 +1,335 @@
+from collections import deque
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from utils.singleflight import file_lock
+
+# Integrity-aware handling of pyrsig working directories.
+#
+# pyrsig writes downloads straight into its workdir and reuses whatever file it
+# finds there, so an interrupted or truncated download poisons every later
+# read. `cached_download` instead runs each download in a private staging
+# directory next to the shared workdir:
+#   - verified files that earlier downloads with the same key produced are
+#     hard-linked into staging so pyrsig still reuses them (pyrsig's file
+#     names don't include the bbox, so other keys' files are never staged),
+#   - new files are moved into the workdir (atomic rename) only after the
+#     download has been read successfully, and recorded in a manifest with
+#     their size (and optionally a SHA-256), the key that produced them and
+#     when they were last used,
+#   - on a corrupt-file error only the offending file is quarantined and the
+#     download is retried once,
+#   - downloads with the same key are serialized across processes by a lock
+#     file, so a second process finds the first one's files instead of
+#     downloading them again,
+#   - `evict_all` deletes files unused for longer than the retention period,
+#     then the least recently used ones while a workdir is over its size
+#     budget; PollutantStore runs it with its own retention.
+
+MANIFEST = "manifest.json"
+QUARANTINE_DIR = "quarantine"
+VERIFY_CHECKSUM = False  # size checks by default; True also compares SHA-256 on every read
+MAX_WORKDIR_BYTES = 2 * 1024 ** 3  # per workdir; least recently used files are evicted beyond this
+
+_stats_lock = threading.Lock()
+_stats = {"quarantined_files": 0, "quarantined_bytes": 0, "retries": 0, "evicted_files": 0, "evicted_bytes": 0}
+_events = deque(maxlen=100)
+_workdirs = set()  # workdirs used by this process, swept by evict_all
+
+
+def _manifest_lock(workdir):
+    """Lock guarding the workdir's manifest and file moves, across threads and processes."""
+    return file_lock(os.path.join(workdir, ".manifest.lock"))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_corruption_error(e):
+    """True for the errors pandas/pyrsig raise on truncated or non-gzip downloads."""
+    message = str(e).lower()
+    return (isinstance(e, (EOFError, gzip.BadGzipFile))
+            or "gzip" in message
+            or "compressed file ended" in message
+            or "crc check failed" in message)
+
+
+def gzip_ok(path):
+    """Decompress `path` end to end; False if it is truncated or not gzip."""
+    try:
+        with gzip.open(path, "rb") as f:
+            while f.read(1 << 20):
+                pass
+        return True
+    except (OSError, EOFError):
+        return False
+
+
+def _load_manifest(workdir):
+    try:
+        with open(os.path.join(workdir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(workdir, manifest):
+    path = os.path.join(workdir, MANIFEST)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def _entry(path, checksum):
+    entry = {"size": os.path.getsize(path)}
+    if checksum:
+        entry["sha256"] = _sha256(path)
+    return entry
+
+
+def _verify(path, entry, checksum):
+    """Check a workdir file against its manifest entry (or gzip-test an unknown file)."""
+    if entry is None:
+        return not path.endswith(".gz") or gzip_ok(path)
+    if os.path.getsize(path) != entry["size"]:
+        return False
+    if checksum and "sha256" in entry and _sha256(path) != entry["sha256"]:
+        return False
+    return True
+
+
+def quarantine(workdir, name, reason):
+    """Move one file out of `workdir` into its quarantine directory and record the event."""
+    path = os.path.join(workdir, name)
+    qdir = os.path.join(workdir, QUARANTINE_DIR)
+    os.makedirs(qdir, exist_ok=True)
+    try:
+        size = os.path.getsize(path)
+        os.replace(path, os.path.join(qdir, f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{name}"))
+    except FileNotFoundError:
+        return
+
+    with _stats_lock:
+        _stats["quarantined_files"] += 1
+        _stats["quarantined_bytes"] += size
+        _events.append({
+            "time": datetime.now().isoformat(timespec='seconds'),
+            "workdir": workdir,
+            "file": name,
+            "bytes": size,
+            "reason": reason,
+        })
+    print(f"Quarantined {path} ({size} bytes): {reason}")
+
+
+def integrity_stats():
+    """Counters and the most recent quarantine events."""
+    with _stats_lock:
+        return {**_stats, "recent_events": list(_events)}
+
+
+def _key_id(key):
+    return None if key is None else hashlib.sha1(key.encode()).hexdigest()
+
+
+def _stage(workdir, staging, checksum, key_id=None):
+    """
+    Hard-link the verified workdir files recorded for `key_id` (every file
+    if None) into `staging`; quarantine the ones that fail verification.
+    """
+    with _manifest_lock(workdir):
+        manifest = _load_manifest(workdir)
+        if key_id is None:
+            names = [name for name in os.listdir(workdir)
+                     if name != MANIFEST and not name.startswith(".") and os.path.isfile(os.path.join(workdir, name))]
+        else:
+            names = [name for name, entry in manifest.items() if key_id in entry.get("keys", ())]
+        changed = False
+        for name in names:
+            path = os.path.join(workdir, name)
+            if not os.path.isfile(path):
+                manifest.pop(name, None)
+                changed = True
+                continue
+            if not _verify(path, manifest.get(name), checksum):
+                quarantine(workdir, name, "failed verification on read")
+                manifest.pop(name, None)
+                changed = True
+                continue
+            if name not in manifest:
+                manifest[name] = _entry(path, checksum)
+            manifest[name]["used"] = time.time()
+            changed = True
+            try:
+                os.link(path, os.path.join(staging, name))
+            except OSError:
+                shutil.copy2(path, os.path.join(staging, name))
+        if changed:
+            _save_manifest(workdir, manifest)
+    return set(os.listdir(staging))
+
+
+def _commit(workdir, staging, staged, checksum, key_id=None):
+    """Move files created during the download from `staging` into `workdir`."""
+    with _manifest_lock(workdir):
+        manifest = _load_manifest(workdir)
+        for name in os.listdir(staging):
+            path = os.path.join(staging, name)
+            if name in staged or not os.path.isfile(path):
+                continue
+            entry = _entry(path, checksum)
+            entry["used"] = time.time()
+            if key_id is not None:
+                entry["keys"] = [key_id]
+            manifest[name] = entry
+            os.replace(path, os.path.join(workdir, name))
+        _save_manifest(workdir, manifest)
+
+
+def _quarantine_corrupt(workdir, staging, staged):
+    """After a corruption error, quarantine linked files that turn out to be bad."""
+    found = False
+    for name in os.listdir(staging):
+        path = os.path.join(staging, name)
+        if not name.endswith(".gz") or not os.path.isfile(path) or gzip_ok(path):
+            continue
+        found = True
+        if name in staged:
+            with _manifest_lock(workdir):
+                quarantine(workdir, name, "corrupt gzip on read")
+                manifest = _load_manifest(workdir)
+                if manifest.pop(name, None) is not None:
+                    _save_manifest(workdir, manifest)
+    return found
+
+
+def cached_download(workdir, download, checksum=None, key=None):
+    """
+    Run `download(staging_dir)` against an integrity-checked copy of `workdir`.
+
+    Parameters:
+    -----------
+    workdir : str
+        Shared pyrsig working directory.
+    download : callable
+        Called with a private staging directory to use as pyrsig's workdir;
+        its return value is passed through.
+    checksum : bool, optional
+        Compare SHA-256 as well as size on read. Defaults to VERIFY_CHECKSUM.
+    key : str, optional
+        Identifies the download (product, bbox, dates). Downloads with the
+        same key in the same workdir never run at the same time.
+
+    A corrupt file is quarantined and the download retried once; a second
+    failure is raised to the caller.
+    """
+    if checksum is None:
+        checksum = VERIFY_CHECKSUM
+    os.makedirs(workdir, exist_ok=True)
+    with _stats_lock:
+        _workdirs.add(os.path.abspath(workdir))
+
+    if key is None:
+        return _cached_download(workdir, download, checksum)
+    key_id = _key_id(key)
+    with file_lock(os.path.join(workdir, ".locks", f"{key_id}.lock")):
+        return _cached_download(workdir, download, checksum, key_id)
+
+
+def _cached_download(workdir, download, checksum, key_id=None):
+    for attempt in range(2):
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=workdir)
+        try:
+            staged = _stage(workdir, staging, checksum, key_id)
+            try:
+                result = download(staging)
+            except Exception as e:
+                if attempt == 0 and is_corruption_error(e):
+                    _quarantine_corrupt(workdir, staging, staged)
+                    with _stats_lock:
+                        _stats["retries"] += 1
+                    print(f"Corrupt download in {workdir} ({e}), retrying once...")
+                    continue
+                raise
+            _commit(workdir, staging, staged, checksum, key_id)
+            return result
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _remove(path):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    with _stats_lock:
+        _stats["evicted_files"] += 1
+        _stats["evicted_bytes"] += size
+    return size
+
+
+def evict(workdir, max_age, max_bytes=MAX_WORKDIR_BYTES, now=None):
+    """
+    Delete workdir files (and quarantined files) not used for `max_age`
+    seconds, then the least recently used files while the workdir holds
+    more than `max_bytes`. Files that aren't in the manifest count as used
+    when last modified. Returns how many files were removed.
+    """
+    if now is None:
+        now = time.time()
+    if not os.path.isdir(workdir):
+        return 0
+
+    removed = 0
+    qdir = os.path.join(workdir, QUARANTINE_DIR)
+    if os.path.isdir(qdir):
+        for name in os.listdir(qdir):
+            path = os.path.join(qdir, name)
+            if os.path.isfile(path) and now - os.path.getmtime(path) > max_age:
+                removed += bool(_remove(path))
+
+    with _manifest_lock(workdir):
+        manifest = _load_manifest(workdir)
+        files = []  # (last used, name, size)
+        for name in os.listdir(workdir):
+            path = os.path.join(workdir, name)
+            if name == MANIFEST or name.startswith(".") or not os.path.isfile(path):
+                continue
+            entry = manifest.get(name, {})
+            files.append((entry.get("used", os.path.getmtime(path)), name, os.path.getsize(path)))
+        files.sort()
+
+        total = sum(size for _, _, size in files)
+        for used, name, size in files:
+            if now - used <= max_age and total <= max_bytes:
+                break
+            _remove(os.path.join(workdir, name))
+            manifest.pop(name, None)
+            total -= size
+            removed += 1
+        if removed:
+            _save_manifest(workdir, manifest)
+    return removed
+
+
+def evict_all(max_age, max_bytes=MAX_WORKDIR_BYTES):
+    """`evict` every workdir this process has downloaded into. Returns how many files were removed."""
+    with _stats_lock:
+        workdirs = sorted(_workdirs)
+    removed = sum(evict(workdir, max_age, max_bytes) for workdir in workdirs)
+    if removed:
+        print(f"Evicted {removed} raw RSIG files unused for {max_age / 86400:g} days or over budget")
+    return removed
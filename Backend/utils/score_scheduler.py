@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+from utils.cache import TTLCache, grid_key, GRID
+
+
+class ScoreScheduler:
+    """
+    Precomputes results for a set of hot locations in the background so the
+    request thread can answer from memory.
+
+    The hot set is the seed locations plus the most recently requested grid
+    cells. Each cycle recomputes every hot cell on a bounded worker pool, then
+    sleeps `interval` seconds +/- `jitter` (a fraction) so refreshes don't
+    line up with other periodic upstream traffic.
+    """
+
+    def __init__(self, compute, seeds=(), interval=3600, jitter=0.2, max_workers=2,
+                 fresh_for=None, max_recent=200, max_entries=2048, grid=GRID, results=None):
+        """
+        Parameters:
+        -----------
+        compute : callable
+            compute(bbox) -> result to store for that location. A None
+            result is not stored, so the previous one is kept.
+        seeds : iterable
+            Bboxes that are always hot (e.g. north_american_cities).
+        interval : float
+            Seconds between cycles (before jitter).
+        fresh_for : float, optional
+            How long a stored result counts as fresh. Defaults to 2 * interval.
+        max_recent : int
+            How many recently requested cells are kept hot.
+        results : object, optional
+            Where results go, keyed by grid cell; anything with
+            set(key, value), e.g. an SWRCache the endpoint reads from.
+            Defaults to a TTLCache that expires after `fresh_for`.
+        """
+        self.compute = compute
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.max_recent = max_recent
+        self.grid = grid
+        if results is None:
+            results = TTLCache(ttl=fresh_for or 2 * interval, max_entries=max_entries)
+        self.results = results
+        self._seeds = {grid_key(bbox, grid): bbox for bbox in seeds}
+        self._recent = OrderedDict()  # cell -> bbox, most recent last
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cell(self, bbox):
+        """Grid cell of `bbox`; the key results are stored under."""
+        return grid_key(bbox, self.grid)
+
+    def get(self, bbox):
+        """Fresh stored result for the cell of `bbox`, or None (default TTLCache results only)."""
+        return self.results.get(grid_key(bbox, self.grid))
+
+    def put(self, bbox, result):
+        self.results.set(grid_key(bbox, self.grid), result)
+
+    def note_request(self, bbox):
+        """Mark the cell of `bbox` as recently requested, keeping it hot."""
+        cell = grid_key(bbox, self.grid)
+        with self._lock:
+            self._recent[cell] = bbox
+            self._recent.move_to_end(cell)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def hot_cells(self):
+        with self._lock:
+            return {**self._seeds, **self._recent}
+
+    def _compute_one(self, cell, bbox):
+        try:
+            result = self.compute(bbox)
+        except Exception as e:
+            print(f"Scheduled score failed for {cell}: {e}")
+            return
+        if result is None:
+            # Nothing usable (e.g. every upstream product failed); keep the previous result
+            print(f"Scheduled score for {cell} came back empty; keeping the previous result")
+            return
+        self.results.set(cell, result)
+
+    def run_cycle(self):
+        """Recompute every hot cell once. Returns the number of cells processed."""
+        hot = self.hot_cells()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="score") as executor:
+            for cell, bbox in hot.items():
+                if self._stop.is_set():
+                    break
+                executor.submit(self._compute_one, cell, bbox)
+        return len(hot)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="score-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        # Start at a random point in the first interval so restarts spread out
+        self._stop.wait(random.uniform(0, self.jitter * self.interval))
+        while not self._stop.is_set():
+            start = time.time()
+            n = self.run_cycle()
+            print(f"Score scheduler refreshed {n} locations in {time.time() - start:.1f}s")
+            self._stop.wait(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
@@ -0,0 +1,80 @@
+import numpy as np
+
+# Table-driven pollutant scoring. Each pollutant has ascending bin edges, the
+# score of each bin, and which side an edge value falls on, so every rating is
+# a single numpy.searchsorted over the whole array of values.
+#
+#   side='left'  -> value == edge goes to the lower bin ("<= edge")
+#   side='right' -> value == edge goes to the upper bin ("< edge")
+
+GOOD = 3
+FAIR = 2
+POOR = 1
+MISSING = 0
+
+THRESHOLDS = {
+    # molecules/cm2: <= 5e15 good, <= 1e16 fair, else poor
+    'no2': {'edges': [5e15, 1e16], 'scores': [GOOD, FAIR, POOR], 'side': 'left'},
+    # ug/m3: <= 12 good, <= 35 fair, else poor
+    'pm25': {'edges': [12, 35], 'scores': [GOOD, FAIR, POOR], 'side': 'left'},
+    # DU, inverted - a thin ozone column is worse: < 250 poor, < 300 fair, else good
+    'o3': {'edges': [250, 300], 'scores': [POOR, FAIR, GOOD], 'side': 'right'},
+    # molecules/cm2: <= 2e16 good, <= 6e16 fair, else poor
+    'hcho': {'edges': [2e16, 6e16], 'scores': [GOOD, FAIR, POOR], 'side': 'left'},
+}
+
+_TABLES = {
+    name: (np.asarray(t['edges'], dtype=np.float64), np.asarray(t['scores'], dtype=np.int8), t['side'])
+    for name, t in THRESHOLDS.items()
+}
+
+
+def score_values(pollutant, values):
+    """Score an array of `pollutant` values; NaN scores MISSING."""
+    edges, scores, side = _TABLES[pollutant]
+    values = np.asarray(values, dtype=np.float64)
+    out = scores[np.searchsorted(edges, values, side=side)]
+    return np.where(np.isnan(values), MISSING, out).astype(np.int8)
+
+
+def score_matrix(values, pollutants):
+    """
+    Score a (locations x pollutants) array in one pass.
+
+    Parameters:
+    -----------
+    values : array-like, shape (n_locations, n_pollutants)
+        Pollutant values, NaN where missing.
+    pollutants : list
+        Pollutant name (key of THRESHOLDS) for each column.
+
+    Returns:
+    --------
+    int8 array of the same shape with GOOD/FAIR/POOR, or MISSING for NaN.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    scores = np.empty(values.shape, dtype=np.int8)
+    for j, pollutant in enumerate(pollutants):
+        scores[:, j] = score_values(pollutant, values[:, j])
+    return scores
+
+
+def overall_scores(values, pollutants):
+    """
+    Overall air-quality score per location: the sum of its pollutant scores
+    over the best possible sum (GOOD for every pollutant with data), so 1.0
+    is all-good and 1/3 all-poor. NaN for locations with no data at all.
+    """
+    scores = score_matrix(values, pollutants)
+    available = np.count_nonzero(scores, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(available > 0, scores.sum(axis=1) / (available * GOOD), np.nan)
+
+
+def recent_average(data, n=10):
+    """Mean of the last `n` valid values of a series/array, NaN if there are none."""
+    if data is None:
+        return np.nan
+    values = np.asarray(data, dtype=np.float64)
+    values = values[~np.isnan(values)][-n:]
+    return values.mean() if len(values) else np.nan
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, in-process coalescing still applies
+    fcntl = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs the
+    function, later callers wait for and share its result (or exception).
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+
+    def do(self, flight_key, func, *args, **kwargs):
+        """
+        func(*args, **kwargs), shared with concurrent calls for `flight_key`.
+        (Named so that `func` can itself take a `key` keyword.)
+        """
+        with self._lock:
+            future = self._inflight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[flight_key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[flight_key]
+        return future.result()
+
+    def inflight(self):
+        """Number of keys currently being fetched."""
+        with self._lock:
+            return len(self._inflight)
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock on `path` (created if needed), held for the body
+    of the `with`. Serializes work across processes and across threads, since
+    each entry opens its own file description.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
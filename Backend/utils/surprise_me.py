@@ -4,6 +4,7 @@ import numpy as np
 import random 
 from utils.dtypes import ValidCoords
 from utils.data_getters import get_openmeteo_weather, set_bbox
+from utils.weather_warmer import WeatherWarmer
 
 
 north_american_cities = {
@@ -42,6 +43,9 @@ north_american_cities = {
     "San Juan, Puerto Rico": {"lat": 18.42, "lon": -66.06}
 }
 
+# Keeps current weather for every city warm in the background; started by backend.py
+weather_warmer = WeatherWarmer(north_american_cities)
+
 
 def surprise_me(): 
 
@@ -63,14 +67,19 @@ def surprise_me():
     
     newCoords = ValidCoords(longitude=city_lon, latitude=city_lat)
 
-    bbox = set_bbox(newCoords.lat, newCoords.lon)
+    # Served from memory once the warmer has run; otherwise fetch it once
+    weather = weather_warmer.get(city)
+    if weather is None: 
+        bbox = set_bbox(newCoords.lat, newCoords.lon)
+        weather = get_openmeteo_weather(bbox)['current']
+
     print("City: ", city)
-    print("Today's temp: ", get_openmeteo_weather(bbox)['current']['temp'])
+    print("Today's temp: ", weather['temp'])
     print("Coords: ", city_lat)
 
     return {
         "city": city, 
-        "weather": get_openmeteo_weather(bbox)['current'], 
+        "weather": weather, 
         "coords": [city_lat, city_lon]
     } 
 
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from utils.singleflight import SingleFlight
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate cache for endpoint results.
+
+    An entry younger than `fresh_for` seconds is served as is. Up to
+    `stale_for` seconds past that it is still served immediately, and a
+    background refresh is started (at most one per key). Older or missing
+    entries are computed on the caller's thread; concurrent callers for the
+    same key share that computation.
+
+    A failed result (None by default, see `failed`) never replaces a good
+    one that can still be served; it is only stored when there is nothing
+    better, and then only for `failed_for` seconds. Refreshes after a
+    failure wait `failed_for` seconds too.
+    """
+
+    def __init__(self, fresh_for, stale_for, max_entries=2048, max_workers=2, name="swr",
+                 failed_for=60, failed=None):
+        self.fresh_for = fresh_for
+        self.stale_for = stale_for
+        self.max_entries = max_entries
+        self.name = name
+        self.failed_for = failed_for
+        self.failed = (lambda value: value is None) if failed is None else failed
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._data = OrderedDict()  # key -> (value, stored_at, ok)
+        self._failed_at = {}  # key -> time of the last failed result
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-refresh")
+
+    def set(self, key, value):
+        """Store `value` for `key`. Returns the value now served for it."""
+        now = time.time()
+        ok = not self.failed(value)
+        with self._lock:
+            if ok:
+                self._failed_at.pop(key, None)
+            else:
+                self.failures += 1
+                self._failed_at[key] = now
+                entry = self._data.get(key)
+                if entry is not None and entry[2] and now - entry[1] <= self.fresh_for + self.stale_for:
+                    return entry[0]  # keep serving the last good value
+            self._data[key] = (value, now, ok)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self._failed_at.pop(evicted, None)
+        return value
+
+    def age(self, key):
+        """Seconds since `key` was stored, or None if it isn't cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else time.time() - entry[1]
+
+    def _compute_and_store(self, key, compute):
+        return self.set(key, compute())
+
+    def _refresh(self, key, compute):
+        try:
+            self._flights.do(key, self._compute_and_store, key, compute)
+        except Exception as e:
+            print(f"Background refresh of {self.name} {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key, compute):
+        """
+        Return (value, age_seconds) for `key`, calling compute() when the
+        cached value is missing or too old to serve.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                value, stored_at, ok = entry
+                age = time.time() - stored_at
+                if age <= (self.fresh_for if ok else self.failed_for):
+                    self.fresh_hits += 1
+                    return value, age
+                if ok and age <= self.fresh_for + self.stale_for:
+                    self.stale_hits += 1
+                    retry_at = self._failed_at.get(key, 0) + self.failed_for
+                    if key not in self._refreshing and time.time() >= retry_at:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, compute)
+                    return value, age
+            self.misses += 1
+
+        value = self._flights.do(key, self._compute_and_store, key, compute)
+        return value, self.age(key) or 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "refreshing": len(self._refreshing),
+            }
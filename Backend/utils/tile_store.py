@@ -0,0 +1,318 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyproj
+import pyrsig
+from utils.cache import RETENTION_DAYS
+from utils.dtypes import ValidCoords
+from utils.rsig_cache import cached_download, evict as evict_raw
+
+# Pre-gridded TEMPO tiles for O(1) point lookups.
+#
+# A scheduled refresh asks RSIG for the whole coverage region (ValidCoords
+# limits) regridded to its default IOAPI grid (`RsigApi.to_ioapi`, the path
+# used in scripts/tutorials/test_pyRSIG.py) and stores one float32 array per
+# product and UTC day:
+#   <root>/<product>/grid.json          projection + cell-center axes
+#   <root>/<product>/<YYYY-MM-DD>.npy   shape (24, ROW, COL), NaN = no data
+#   <root>/<product>/<YYYY-MM-DD>.hours.json   hours of the day fetched so far
+# Queries project the point once and index straight into memory-mapped days.
+# The hours sidecar tells an hour RSIG had no data for (e.g. night) from one
+# that was never fetched, so a backfill only requests the missing hours.
+# Downloads go through rsig_cache like every other RSIG request; the raw
+# files are only needed until their hours are in the tiles, so they are
+# evicted after RAW_RETENTION.
+
+TILE_ROOT = "tile_store"
+COVERAGE = (ValidCoords.MIN_LON, ValidCoords.MIN_LAT, ValidCoords.MAX_LON, ValidCoords.MAX_LAT)
+TILE_PRODUCTS = [
+    'tempo.l2.no2.vertical_column_troposphere',
+    'tempo.l3.hcho.vertical_column',
+    'tempo.l2.o3tot.column_amount_o3',
+]
+OPEN_DAYS = 128  # memory-mapped day files kept open per store
+RAW_RETENTION = 6 * 60 * 60  # seconds raw downloads are kept in the workdir
+
+
+def _naive_utc(t):
+    """Timestamp in UTC without tzinfo (naive input is taken as UTC)."""
+    t = pd.Timestamp(t)
+    return t if t.tzinfo is None else t.tz_convert('UTC').tz_localize(None)
+
+
+class TileStore:
+    """
+    Day files of hourly gridded values per product, memory-mapped for reads.
+    One writer (the refresher) and any number of readers.
+    """
+
+    def __init__(self, root=TILE_ROOT, workdir="pyrsig_tiles", retention_days=RETENTION_DAYS):
+        self.root = root
+        self.workdir = workdir
+        self.retention_days = retention_days
+        self._grids = {}
+        self._open = OrderedDict()  # (product, day) -> memmap
+        self._lock = threading.Lock()
+
+    # ---- refresh (writer side) ---- #
+
+    def refresh(self, product, bdate, edate, variable=None):
+        """
+        Fetch `product` for the coverage region between bdate and edate (UTC
+        ISO strings or datetimes) and write every returned hour into its day
+        file. Returns the number of hours written.
+        """
+        def download(staging):
+            api = pyrsig.RsigApi(bdate=bdate, edate=edate, bbox=COVERAGE, workdir=staging, gridfit=True)
+            api.tempo_kw['api_key'] = 'anonymous'
+            return api.to_ioapi(product).load()  # read before the staging directory goes
+
+        ds = cached_download(self.workdir, download, key=repr((product, str(bdate), str(edate))))
+
+        if variable is None:
+            variable = [name for name in ds.data_vars if name != 'TFLAG'][0]
+
+        product_dir = os.path.join(self.root, product)
+        os.makedirs(product_dir, exist_ok=True)
+        self._save_grid(product, {
+            'proj4': ds.attrs['crs_proj4'],
+            'x': [float(v) for v in ds['COL'].values],
+            'y': [float(v) for v in ds['ROW'].values],
+        })
+
+        values = ds[variable].values  # (TSTEP, LAY, ROW, COL)
+        times = pd.to_datetime(ds['TSTEP'].values)
+        written = 0
+        for i, t in enumerate(times):
+            layer = values[i, 0].astype(np.float32)
+            layer[~(layer > 0)] = np.nan  # fill values and negatives are missing
+            self._write_hour(product, t.strftime("%Y-%m-%d"), t.hour, layer)
+            written += 1
+        self._mark_filled(product, _naive_utc(bdate), _naive_utc(edate))
+        print(f"Tile store: wrote {written} hours of {product}")
+        return written
+
+    def _hours_path(self, product, day):
+        return os.path.join(self.root, product, f"{day}.hours.json")
+
+    def filled_hours(self, product, day):
+        """
+        Hours (0-23) of `day` already fetched. Day files written before the
+        sidecar existed count the hours that hold any data.
+        """
+        try:
+            with open(self._hours_path(product, day)) as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            pass
+        path = os.path.join(self.root, product, f"{day}.npy")
+        if not os.path.exists(path):
+            return set()
+        tile = np.load(path, mmap_mode='r')
+        return {hour for hour in range(tile.shape[0]) if not np.isnan(tile[hour]).all()}
+
+    def _mark_filled(self, product, bdate, edate):
+        """Record every hour that lies wholly within bdate..edate as fetched."""
+        days = {}
+        t = bdate.ceil('h')
+        while t + pd.Timedelta(minutes=59, seconds=59) <= edate:
+            days.setdefault(t.strftime("%Y-%m-%d"), set()).add(t.hour)
+            t += pd.Timedelta(hours=1)
+        for day, hours in days.items():
+            path = self._hours_path(product, day)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(sorted(self.filled_hours(product, day) | hours), f)
+            os.replace(tmp, path)
+
+    def _save_grid(self, product, grid):
+        path = os.path.join(self.root, product, "grid.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(grid, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self._grids.pop(product, None)
+
+    def _write_hour(self, product, day, hour, layer):
+        path = os.path.join(self.root, product, f"{day}.npy")
+        with self._lock:
+            self._open.pop((product, day), None)
+        if os.path.exists(path):
+            tile = np.load(path, mmap_mode='r+')
+        else:
+            tile = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(24,) + layer.shape)
+            tile[:] = np.nan
+        tile[hour] = layer
+        tile.flush()
+        del tile
+
+    def evict(self, now=None):
+        """
+        Delete day files older than `retention_days`, and raw downloads older
+        than RAW_RETENTION. Returns how many day files were removed.
+        """
+        if now is None:
+            now = datetime.now(timezone.utc)
+        evict_raw(self.workdir, RAW_RETENTION, now=now.timestamp())
+        cutoff = (now - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        removed = 0
+        for product in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            product_dir = os.path.join(self.root, product)
+            for name in os.listdir(product_dir):
+                if name.endswith(".npy") and name[:-4] < cutoff:
+                    with self._lock:
+                        self._open.pop((product, name[:-4]), None)
+                    os.remove(os.path.join(product_dir, name))
+                    removed += 1
+                elif name.endswith(".hours.json") and name[:-len(".hours.json")] < cutoff:
+                    os.remove(os.path.join(product_dir, name))
+        return removed
+
+    # ---- lookups (reader side) ---- #
+
+    def _grid(self, product):
+        with self._lock:
+            grid = self._grids.get(product)
+        if grid is None:
+            with open(os.path.join(self.root, product, "grid.json")) as f:
+                raw = json.load(f)
+            x = np.array(raw['x'])
+            y = np.array(raw['y'])
+            grid = {
+                'proj': pyproj.Proj(raw['proj4']),
+                'x0': x[0], 'dx': x[1] - x[0], 'nx': len(x),
+                'y0': y[0], 'dy': y[1] - y[0], 'ny': len(y),
+            }
+            with self._lock:
+                self._grids[product] = grid
+        return grid
+
+    def _day(self, product, day):
+        key = (product, day)
+        with self._lock:
+            tile = self._open.get(key)
+            if tile is not None:
+                self._open.move_to_end(key)
+                return tile
+        path = os.path.join(self.root, product, f"{day}.npy")
+        if not os.path.exists(path):
+            return None
+        tile = np.load(path, mmap_mode='r')
+        with self._lock:
+            self._open[key] = tile
+            while len(self._open) > OPEN_DAYS:
+                self._open.popitem(last=False)
+        return tile
+
+    def cell_index(self, product, lon, lat):
+        """(row, col) of the grid cell containing lon/lat, or None if off-grid."""
+        grid = self._grid(product)
+        x, y = grid['proj'](lon, lat)
+        col = int(round((x - grid['x0']) / grid['dx']))
+        row = int(round((y - grid['y0']) / grid['dy']))
+        if not (0 <= col < grid['nx'] and 0 <= row < grid['ny']):
+            return None
+        return row, col
+
+    def lookup(self, product, lon, lat, bdate, edate):
+        """
+        Hourly values of `product` at lon/lat between bdate and edate (UTC).
+        Returns a Series indexed by time with missing hours dropped.
+        """
+        bdate = _naive_utc(bdate)
+        edate = _naive_utc(edate)
+        index = self.cell_index(product, lon, lat)
+        if index is None:
+            return pd.Series(dtype=np.float32, name=product)
+        row, col = index
+
+        times = []
+        values = []
+        for day in pd.date_range(bdate.normalize(), edate.normalize(), freq='D'):
+            tile = self._day(product, day.strftime("%Y-%m-%d"))
+            if tile is None:
+                continue
+            column = np.asarray(tile[:, row, col])
+            hours = day + pd.to_timedelta(np.arange(24), unit='h')
+            keep = ~np.isnan(column) & (hours >= bdate) & (hours <= edate)
+            times.append(hours[keep].values)
+            values.append(column[keep])
+
+        if not values:
+            return pd.Series(dtype=np.float32, name=product)
+        return pd.Series(np.concatenate(values), index=pd.DatetimeIndex(np.concatenate(times), name='time'), name=product)
+
+
+class TileRefresher:
+    """
+    Background thread that keeps the tile store current: on start it
+    backfills `backfill_days`, then every `interval` seconds re-fetches the
+    trailing `lookback_hours` for each product and evicts expired days.
+    """
+
+    def __init__(self, store, products=TILE_PRODUCTS, interval=3600, lookback_hours=3, backfill_days=30):
+        self.store = store
+        self.products = products
+        self.interval = interval
+        self.lookback_hours = lookback_hours
+        self.backfill_days = backfill_days
+        self.last_refresh = {}  # product -> ISO time of last successful refresh
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tile-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _refresh(self, product, bdate, edate):
+        try:
+            self.store.refresh(product, bdate.isoformat(timespec='seconds'), edate.isoformat(timespec='seconds'))
+            self.last_refresh[product] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        except Exception as e:
+            print(f"Tile refresh failed for {product}: {e}")
+
+    def backfill(self):
+        """
+        Fill the last `backfill_days` one day at a time, fetching only the
+        runs of hours not stored yet.
+        """
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        for product in self.products:
+            for n in range(self.backfill_days, 0, -1):
+                day = today - timedelta(days=n)
+                filled = self.store.filled_hours(product, day.strftime('%Y-%m-%d'))
+                missing = [hour for hour in range(24) if hour not in filled]
+                runs = []
+                for hour in missing:
+                    if runs and runs[-1][1] == hour - 1:
+                        runs[-1][1] = hour
+                    else:
+                        runs.append([hour, hour])
+                for first, last in runs:
+                    if self._stop.is_set():
+                        return
+                    self._refresh(product, day + timedelta(hours=first), day + timedelta(hours=last, minutes=59, seconds=59))
+
+    def _run(self):
+        self.backfill()
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            for product in self.products:
+                if self._stop.is_set():
+                    break
+                self._refresh(product, now - timedelta(hours=self.lookback_hours), now)
+            self.store.evict()
+            self._stop.wait(self.interval)
@@ -0,0 +1,117 @@
+from datetime import datetime
+import threading
+import time
+from utils.data_getters import get_current_weather, set_bbox
+from utils.cache import OPENMETEO_CADENCE
+
+
+class WeatherWarmer:
+    """
+    Background thread that keeps current weather for a fixed set of locations
+    in memory, so lookups never wait on Open-Meteo.
+
+    Every `interval` seconds the warmer refreshes the stalest locations first,
+    making at most `max_calls_per_cycle` upstream calls (current conditions
+    only, no forecast). With a budget smaller than the number of locations,
+    the rest are picked up on the next cycles. An entry older than `max_age`
+    (e.g. the thread stalled) is fetched live on `get` instead of served.
+    """
+
+    def __init__(self, locations, interval=OPENMETEO_CADENCE, max_calls_per_cycle=60, max_age=None):
+        """
+        Parameters:
+        -----------
+        locations : dict
+            name -> {"lat": float, "lon": float}, e.g. north_american_cities.
+            Locations set_bbox rejects (outside ValidCoords) are left out.
+        interval : float
+            Seconds between refresh cycles.
+        max_calls_per_cycle : int
+            Upstream call budget per cycle.
+        max_age : float, optional
+            Seconds an entry may be served. Defaults to 2 * interval.
+        """
+        self.locations = {}
+        self._bboxes = {}  # name -> bbox
+        for name, coords in locations.items():
+            try:
+                self._bboxes[name] = set_bbox(coords['lat'], coords['lon'])
+            except ValueError as e:
+                print(f"Weather warmer skipping {name}: {e}")
+                continue
+            self.locations[name] = coords
+        self.interval = interval
+        self.max_calls_per_cycle = max_calls_per_cycle
+        self.max_age = 2 * interval if max_age is None else max_age
+        self._entries = {}  # name -> (current weather dict, refreshed_at epoch seconds)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self, name):
+        """
+        Current weather for `name`: the warmed entry if younger than
+        `max_age`, otherwise fetched live (and stored). None if `name` isn't
+        a warmed location or the live fetch fails.
+        """
+        entry = self._entries.get(name)
+        if entry is not None and time.time() - entry[1] <= self.max_age:
+            return entry[0]
+        if name not in self._bboxes:
+            return None
+        try:
+            return self._refresh_one(name)
+        except Exception as e:
+            print(f"Weather warmer live fetch failed for {name}: {e}")
+            return None
+
+    def _refresh_one(self, name):
+        current = get_current_weather(self._bboxes[name])
+        with self._lock:
+            self._entries[name] = (current, time.time())
+        return current
+
+    def status(self):
+        """name -> ISO timestamp of the last successful refresh (None if never)."""
+        with self._lock:
+            return {
+                name: (datetime.fromtimestamp(self._entries[name][1]).isoformat(timespec='seconds')
+                       if name in self._entries else None)
+                for name in self.locations
+            }
+
+    def refresh_cycle(self):
+        """Refresh up to `max_calls_per_cycle` locations, stalest first. Returns the number refreshed."""
+        with self._lock:
+            order = sorted(self.locations, key=lambda name: self._entries.get(name, (None, 0))[1])
+
+        refreshed = 0
+        for name in order[:self.max_calls_per_cycle]:
+            if self._stop.is_set():
+                break
+            try:
+                self._refresh_one(name)
+            except Exception as e:
+                print(f"Weather warmer failed for {name}: {e}")
+                continue
+            refreshed += 1
+        return refreshed
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.time()
+            refreshed = self.refresh_cycle()
+            print(f"Weather warmer refreshed {refreshed}/{len(self.locations)} locations in {time.time() - start:.1f}s")
+            self._stop.wait(self.interval)